@@ -0,0 +1 @@
+""" Benchmarks for the preprocessing and join pipeline, run on synthetic lipad-style data. """
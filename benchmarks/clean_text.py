@@ -0,0 +1,39 @@
+""" Report speeches per second for clean_texts run serially and over a process pool.
+
+    Usage: python -m benchmarks.clean_text --speeches 20000 --workers 1 2 4 [--tokenizer toktok]
+"""
+import argparse
+import time
+
+from preprocessing import TOKENIZERS, TextCleaner, clean_texts
+from benchmarks.synthetic import make_speeches
+
+def run(n_speeches=20000, workers=(1, 2, 4), chunksize=2000, seed=0, tokenizer='fast'):
+    """ Time clean_texts for each worker count on the same synthetic corpus and check outputs agree. """
+    speeches = make_speeches(n_speeches, seed=seed)
+    reference = None
+    rows = []
+    for n in workers:
+        # fresh cleaner so the stem and contraction caches start cold for every run
+        cleaner = TextCleaner(tokenizer=tokenizer)
+        start = time.perf_counter()
+        cleaned = clean_texts(speeches, workers=n, chunksize=chunksize, cleaner=cleaner)
+        elapsed = time.perf_counter() - start
+        if reference is None:
+            reference = cleaned
+        elif cleaned != reference:
+            raise AssertionError(f'output with {n} workers differs from serial output')
+        rows.append((n, elapsed, len(speeches)/elapsed))
+    return rows
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark clean_texts serially and with N worker processes.')
+    parser.add_argument('--speeches', type=int, default=20000, help='number of synthetic speeches')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='worker counts to time')
+    parser.add_argument('--chunksize', type=int, default=2000, help='speeches per worker chunk')
+    parser.add_argument('--tokenizer', choices=TOKENIZERS, default='fast', help='tokenizer backend of the cleaner')
+    args = parser.parse_args()
+
+    print(f'{"workers":>8} {"seconds":>9} {"speeches/s":>11}')
+    for n, elapsed, rate in run(args.speeches, args.workers, args.chunksize, tokenizer=args.tokenizer):
+        print(f'{n:>8} {elapsed:>9.2f} {rate:>11.0f}')
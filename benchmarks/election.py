@@ -0,0 +1,76 @@
+""" Check and time join_data.generateElectionDataforRidings against the original row-by-row implementation.
+
+    Usage: python -m benchmarks.election --ridings 50000
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from join_data import LABEL_MAP, generateElectionDataforRidings
+from benchmarks.synthetic import make_election
+
+def reference_generateElectionDataforRidings(rawElection, ParliamentNo):
+    """ Original loop implementation, kept to check the vectorized version against. """
+    ridingLabel, candidateLabel, voteObtainedLabel, majorityLabel, provinceLabel = LABEL_MAP[ParliamentNo]
+
+    resultsByParty = pd.DataFrame()
+    resultsByParty['riding'] = list(set(rawElection.loc[:,ridingLabel]))
+    parties = ['NDP', 'Green', 'Bloc Quebecois', 'Liberal', 'Conservative', 'Other']
+    for p in parties:
+        resultsByParty[p+'_share'] = [0]*len(resultsByParty)
+    resultsByParty = resultsByParty.set_index('riding')
+
+    for i in range(len(rawElection)):
+        if 'Liberal' in rawElection[candidateLabel][i]:
+            resultsByParty.loc[rawElection[ridingLabel][i],'Liberal_share'] += rawElection[voteObtainedLabel][i]
+        elif 'Conservative' in rawElection[candidateLabel][i]:
+            resultsByParty.loc[rawElection[ridingLabel][i],'Conservative_share'] += rawElection[voteObtainedLabel][i]
+        elif ('NDP' in rawElection[candidateLabel][i]) or ('N.D.P.' in rawElection[candidateLabel][i]):
+            resultsByParty.loc[rawElection[ridingLabel][i],'NDP_share'] += rawElection[voteObtainedLabel][i]
+        elif 'Bloc' in rawElection[candidateLabel][i]:
+            resultsByParty.loc[rawElection[ridingLabel][i],'Bloc Quebecois_share'] += rawElection[voteObtainedLabel][i]
+        elif 'Green' in rawElection[candidateLabel][i]:
+            resultsByParty.loc[rawElection[ridingLabel][i],'Green_share'] += rawElection[voteObtainedLabel][i]
+        else:
+            resultsByParty.loc[rawElection[ridingLabel][i],'Other_share'] += rawElection[voteObtainedLabel][i]
+
+    resultsByParty.loc[:,'province'] = [0]*len(resultsByParty)
+    for i, riding in enumerate(rawElection[ridingLabel]):
+        resultsByParty.loc[riding,'province'] = rawElection[provinceLabel][i]
+
+    resultsByParty.loc[:,'MP'] = [0]*len(resultsByParty)
+    resultsByParty.loc[:,'competitiveness'] = [0.0]*len(resultsByParty)
+    for i, riding in enumerate(rawElection[ridingLabel]):
+        if not pd.isna(rawElection[majorityLabel][i]):
+            resultsByParty.loc[riding,'MP'] = rawElection[candidateLabel][i]
+            resultsByParty.loc[riding,'competitiveness'] = rawElection[majorityLabel][i]
+
+    resultsByParty.loc[:,'ParliamentNo'] = [ParliamentNo]*len(resultsByParty)
+    return resultsByParty.reset_index()
+
+def check_equivalence(n_ridings=300, seed=0):
+    """ Compare both implementations on synthetic data in every schema of LABEL_MAP; raises if they differ. """
+    for parliament, labels in LABEL_MAP.items():
+        rawElection = make_election(n_ridings, labels, seed=seed+parliament)
+        # the original builds its riding list from a set, so its row order is arbitrary
+        expected = reference_generateElectionDataforRidings(rawElection, parliament).sort_values('riding').reset_index(drop=True)
+        actual = generateElectionDataforRidings(rawElection, parliament)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+def run(n_ridings=50000, parliament=42, seed=0):
+    """ Time the vectorized implementation on one large synthetic election; returns (candidate rows, seconds). """
+    rawElection = make_election(n_ridings, LABEL_MAP[parliament], seed=seed)
+    start = time.perf_counter()
+    generateElectionDataforRidings(rawElection, parliament)
+    return len(rawElection), time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check and time generateElectionDataforRidings.')
+    parser.add_argument('--ridings', type=int, default=50000, help='number of ridings in the timed election')
+    args = parser.parse_args()
+
+    check_equivalence()
+    print(f'vectorized output matches the reference implementation for Parliaments {", ".join(map(str, LABEL_MAP))}')
+    rows, elapsed = run(args.ridings)
+    print(f'{rows} candidate rows in {elapsed:.3f}s ({rows/elapsed:.0f} rows/s)')
@@ -0,0 +1,62 @@
+""" Compare MPMatcher with the original nested name loop of join_data.main, and time both.
+
+    Usage: python -m benchmarks.mp_matching --ridings 300
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from join_data import LABEL_MAP, generateElectionDataforRidings
+from mp_matcher import MPMatcher
+from benchmarks.synthetic import make_election, make_speakers
+
+NEW_COLUMNS = ['riding', 'province', 'Liberal_share', 'Conservative_share', 'NDP_share', 'Bloc Quebecois_share', 'Green_share', 'Other_share', 'competitiveness']
+
+def reference_match(allParliaments, resultsByParty):
+    """ Original O(speakers x MPs) loop, kept to compare MPMatcher against. """
+    allParliaments = allParliaments.copy()
+    for label in NEW_COLUMNS:
+        allParliaments[label] = [0]*len(allParliaments)
+    govtSupportMissingNames = ['Thomas', 'Bradley', 'Bob', 'Joe', 'Patricia', 'Michael']
+
+    for i, MP in enumerate(allParliaments.speakername):
+        for j, MpParty in enumerate(resultsByParty.MP):
+            if (MP.partition(' ')[2] in MpParty) and (MP.partition(' ')[0] in MpParty) and (allParliaments.parliamentNo[i]==str(resultsByParty.ParliamentNo[j])):
+                for label in NEW_COLUMNS:
+                    allParliaments.loc[i,label] = resultsByParty[label][j]
+            elif (MP.partition(' ')[2] in MpParty) and (MP.partition(' ')[0] in govtSupportMissingNames) and not ('Cathy' in MpParty) and (allParliaments.parliamentNo[i]==str(resultsByParty.ParliamentNo[j])):
+                for label in NEW_COLUMNS:
+                    allParliaments.loc[i,label] = resultsByParty[label][j]
+    return allParliaments
+
+def run(n_ridings=300, n_unmatched=50, seed=0):
+    """ Match synthetic speakers with both implementations.
+
+        Returns: (speakers, seconds for the loop, seconds for MPMatcher, rows where they disagree, match report)
+    """
+    resultsByParty = pd.concat([generateElectionDataforRidings(make_election(n_ridings, labels, seed=seed+parl), parl)
+                                for parl, labels in LABEL_MAP.items()], ignore_index=True)
+    speakers = make_speakers(resultsByParty, n_unmatched=n_unmatched, seed=seed)
+
+    start = time.perf_counter()
+    expected = reference_match(speakers, resultsByParty)
+    loopTime = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual, report = MPMatcher(resultsByParty).join(speakers, NEW_COLUMNS)
+    matcherTime = time.perf_counter() - start
+
+    differ = (expected[NEW_COLUMNS].astype(str) != actual[NEW_COLUMNS].astype(str)).any(axis=1)
+    return len(speakers), loopTime, matcherTime, speakers[differ], report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare and time MP-to-riding matching.')
+    parser.add_argument('--ridings', type=int, default=300, help='ridings per synthetic election')
+    parser.add_argument('--unmatched', type=int, default=50, help='speakers without a seat')
+    args = parser.parse_args()
+
+    n, loopTime, matcherTime, differ, report = run(args.ridings, args.unmatched)
+    print(f'{n} speakers: nested loop {loopTime:.2f}s, MPMatcher {matcherTime:.3f}s')
+    print(f'{len(differ)} speakers matched differently; '
+          f'{(report.status == "unmatched").sum()} unmatched, {(report.status == "ambiguous").sum()} ambiguous')
@@ -0,0 +1,66 @@
+""" Compare speech_stats.make_speech_statistics with the original row-by-row implementation, and time both.
+
+    Usage: python -m benchmarks.speech_stats --speeches 200000
+"""
+import argparse
+import os
+import tempfile
+import time
+from collections import Counter
+
+import pandas as pd
+
+from speech_stats import COLUMN_NAMES, make_speech_statistics
+from benchmarks.synthetic import make_corpus
+
+def reference_speech_statistics(path):
+    """ Original implementation, kept to check the chunked version against; returns the statistics df. """
+    result = pd.read_csv(path, sep='\t', header=None, names=COLUMN_NAMES)
+    result['name_parl'] = result.apply(lambda row: row.speakername+'_'+row.speakerparty+'_'+str(row.Parliament), axis=1)
+    result['speech_length'] = result.speechtext.str.count(r'\s+')
+    speechStats = pd.DataFrame.from_dict(Counter(result.name_parl), orient='index', columns=['speechFrequency'])
+    speechStats['totalSpeechLength'] = [0]*len(speechStats)
+    for i in range(len(result)):
+        speechStats.loc[result.name_parl[i],'totalSpeechLength'] += result.speech_length[i]
+    return speechStats
+
+def run(n_speeches=200000, chunksize=50000, reference=True, seed=0):
+    """ Time both implementations on a synthetic corpus.
+
+        Returns: (seconds for the reference or None, seconds for make_speech_statistics, number of MPs that differ)
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = os.path.join(tmp, 'corpus.tsv')
+        # every synthetic speech has at least one word, since the reference counts empty speeches as missing
+        frame = make_corpus(n_speeches, seed=seed)
+        frame[2] = frame[2].where(frame[2] != '', 'word')
+        frame.to_csv(corpus, sep='\t', index=False, header=False)
+
+        start = time.perf_counter()
+        stats = make_speech_statistics(corpus, chunksize=chunksize, output=os.path.join(tmp, 'stats.csv'),
+                                       detailed_output=None, parliament_output=None)
+        chunkedTime = time.perf_counter() - start
+
+        if not reference:
+            return None, chunkedTime, 0
+        start = time.perf_counter()
+        expected = reference_speech_statistics(corpus)
+        referenceTime = time.perf_counter() - start
+
+    actual = stats[['speechFrequency', 'totalSpeechLength']].reindex(expected.index)
+    differ = (actual.values != expected.values).any(axis=1).sum()
+    return referenceTime, chunkedTime, differ
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare and time make_speech_statistics.')
+    parser.add_argument('--speeches', type=int, default=200000, help='number of synthetic speeches')
+    parser.add_argument('--chunksize', type=int, default=50000, help='speeches read at a time')
+    parser.add_argument('--no-reference', action='store_true', help='skip the slow original implementation')
+    args = parser.parse_args()
+
+    referenceTime, chunkedTime, differ = run(args.speeches, args.chunksize, reference=not args.no_reference)
+    if referenceTime is not None:
+        print(f'original: {referenceTime:.2f}s ({args.speeches/referenceTime:.0f} speeches/s)')
+    print(f'chunked:  {chunkedTime:.2f}s ({args.speeches/chunkedTime:.0f} speeches/s)')
+    if referenceTime is not None:
+        print(f'{differ} MPs with different statistics')
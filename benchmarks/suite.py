@@ -0,0 +1,220 @@
+""" Time every stage of the pipeline on synthetic data and compare the results with a stored baseline.
+
+    Each case runs in its own spawned process: its data is loaded first, then only the stage itself is timed,
+    REPEATS times by default, keeping the fastest run. Its memory is the largest growth of peak resident memory
+    over a timed run (Linux only, read from /proc; worker processes of the cleaning stages are not counted).
+
+    Usage: python -m benchmarks.suite --speeches 100000 --save-baseline baseline.json
+           python -m benchmarks.suite --speeches 100000 --compare baseline.json --threshold 0.1
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from join_data import LABEL_MAP
+from benchmarks.synthetic import make_election, make_embeddings, make_speakers, write_corpus, write_parliaments
+
+CASES = ['clean_text', 'preprocessing', 'speech_stats', 'election_files', 'election', 'mp_matching', 'pca']
+# memory growth below this is noise from the allocator rather than a regression
+MEMORY_FLOOR_MB = 5
+# slowdowns below this many seconds are timer and scheduler noise rather than a regression
+TIME_FLOOR_SECONDS = 0.05
+# timed runs of each case; the fastest is reported
+REPEATS = 5
+
+def scales(n_speeches):
+    """ Sizes of the synthetic inputs for a corpus of n_speeches, in the proportions of the Hansard data. """
+    # documents are scaled up beyond the Hansard proportion so that PCA takes a measurable time
+    return {'speeches': n_speeches, 'ridings': max(100, n_speeches//30), 'documents': max(20000, n_speeches//5)}
+
+def _election_path(data_dir, parliament):
+    return os.path.join(data_dir, 'electionResults', f'{parliament}Election.csv')
+
+def prepare(data_dir, n_speeches, seed=0):
+    """ Write the synthetic inputs of every case to data_dir, unless they are already there for this scale.
+
+        Writes {parliament number}Parl.csv speech files, the embeddings corpus, one election file per
+        LABEL_MAP schema (the 38th and 39th in latin-1, like the originals), and Doc2Vec-like vectors.
+    """
+    size = scales(n_speeches)
+    marker = os.path.join(data_dir, 'scale.json')
+    if os.path.exists(marker):
+        with open(marker) as f:
+            if json.load(f) == dict(size, seed=seed):
+                return
+    os.makedirs(os.path.join(data_dir, 'electionResults'), exist_ok=True)
+
+    write_parliaments(os.path.join(data_dir, 'parliament_speeches'), n_speeches, seed=seed)
+    write_corpus(os.path.join(data_dir, 'corpus.tsv'), n_speeches, seed=seed)
+    for parliament, labels in LABEL_MAP.items():
+        make_election(size['ridings'], labels, seed=seed + parliament).to_csv(
+            _election_path(data_dir, parliament), index=False, encoding='latin-1' if parliament < 40 else 'utf-8')
+    vectors, labels = make_embeddings(size['documents'], seed=seed)
+    np.save(os.path.join(data_dir, 'vectors.npy'), vectors)
+
+    with open(marker, 'w') as f:
+        json.dump(dict(size, seed=seed), f)
+
+def _read_elections(data_dir):
+    rawElections = {}
+    for parliament in LABEL_MAP:
+        try:
+            rawElections[parliament] = pd.read_csv(_election_path(data_dir, parliament))
+        except UnicodeDecodeError:
+            rawElections[parliament] = pd.read_csv(_election_path(data_dir, parliament), encoding='latin-1')
+    return rawElections
+
+def _results_by_party(rawElections):
+    from join_data import generateElectionDataforRidings
+    return pd.concat([generateElectionDataforRidings(raw, parliament) for parliament, raw in rawElections.items()], ignore_index=True)
+
+def setup(case, data_dir, work_dir, workers=1):
+    """ Load the inputs of a case and return (function running the stage, number of items it processes). """
+    if case == 'clean_text':
+        from preprocessing import TextCleaner, clean_texts
+        texts = pd.read_csv(os.path.join(data_dir, 'parliament_speeches', '42Parl.csv'), usecols=['speechtext']).speechtext.tolist()
+        return (lambda: clean_texts(texts, workers=workers, cleaner=TextCleaner())), len(texts)
+
+    if case == 'preprocessing':
+        import preprocessing
+        with open(os.path.join(data_dir, 'scale.json')) as f:
+            n = json.load(f)['speeches']
+        return (lambda: preprocessing.main(workers=workers, stream=True, root=os.path.join(data_dir, 'parliament_speeches'),
+                                           output=os.path.join(work_dir, 'corpus.tsv'))), n
+
+    if case == 'speech_stats':
+        from speech_stats import make_speech_statistics
+        with open(os.path.join(data_dir, 'scale.json')) as f:
+            n = json.load(f)['speeches']
+        return (lambda: make_speech_statistics(os.path.join(data_dir, 'corpus.tsv'), output=os.path.join(work_dir, 'stats.csv'),
+                                               detailed_output=None, parliament_output=None)), n
+
+    if case == 'election_files':
+        from elections import load_elections
+        return (lambda: load_elections(os.path.join(data_dir, 'electionResults'), cache_dir=None)), len(LABEL_MAP)
+
+    if case == 'election':
+        rawElections = _read_elections(data_dir)
+        return (lambda: _results_by_party(rawElections)), sum(len(raw) for raw in rawElections.values())
+
+    if case == 'mp_matching':
+        from mp_matcher import MPMatcher
+        from benchmarks.mp_matching import NEW_COLUMNS
+        resultsByParty = _results_by_party(_read_elections(data_dir))
+        speakers = make_speakers(resultsByParty, n_unmatched=len(resultsByParty)//10)
+        return (lambda: MPMatcher(resultsByParty).join(speakers, NEW_COLUMNS)), len(speakers)
+
+    if case == 'pca':
+        from embeddings import fit_pca
+        vectors = np.load(os.path.join(data_dir, 'vectors.npy'))
+        return (lambda: fit_pca(vectors, 2, 'full')), len(vectors)
+
+    raise ValueError(f'unknown benchmark case {case}, expected one of {CASES}')
+
+def _memory_mb(field):
+    """ VmRSS (current) or VmHWM (peak) resident memory of this process, from /proc on Linux. """
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])/1024
+
+def _run_case(case, data_dir, workers, repeats):
+    with tempfile.TemporaryDirectory() as work_dir:
+        fn, items = setup(case, data_dir, work_dir, workers)
+        times, memory = [], 0.0
+        for _ in range(repeats):
+            # reset the peak so that loading the inputs (or an earlier run) does not mask this run's peak
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            before = _memory_mb('VmRSS')
+            start = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - start)
+            memory = max(memory, _memory_mb('VmHWM') - before)
+    seconds = min(times)
+    return {'seconds': seconds, 'median_seconds': float(np.median(times)), 'repeats': repeats, 'items': items,
+            'throughput': items/seconds, 'memory_mb': memory}
+
+def run_case(case, data_dir, workers=1, repeats=REPEATS):
+    """ Run one case in a fresh spawned process, so neither its memory nor its caches leak into the next. """
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(_run_case, (case, data_dir, workers, repeats))
+
+def run(n_speeches=100000, cases=CASES, workers=1, data_dir=None, seed=0, repeats=REPEATS):
+    """ Generate the synthetic data and run the cases.
+
+        Args: n_speeches: size of the synthetic corpus, from which the number of ridings and documents are derived
+              cases: names of the cases to run, see CASES
+              workers: processes used by the cleaning stages
+              data_dir: directory the synthetic data is written to and reused from; a temporary one if None
+              repeats: timed runs of each case; seconds and throughput are those of the fastest
+        Returns: dict of the scale and, under 'results', each case's seconds, median_seconds, items, throughput,
+                 and memory_mb
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = data_dir or tmp
+        prepare(data_dir, n_speeches, seed)
+        results = {case: run_case(case, data_dir, workers, repeats) for case in cases}
+    return {'scale': scales(n_speeches), 'workers': workers, 'results': results}
+
+def compare(current, baseline, threshold=0.1):
+    """ Compare each case with a baseline run.
+
+        Returns: df indexed by case with the throughput and memory change relative to the baseline, and
+                 whether either regressed by more than threshold (slower by more than TIME_FLOOR_SECONDS, or
+                 more memory beyond MEMORY_FLOOR_MB)
+    """
+    rows = []
+    for case, result in current['results'].items():
+        if case not in baseline['results']:
+            continue
+        base = baseline['results'][case]
+        throughputChange = result['throughput']/base['throughput'] - 1
+        memoryChange = result['memory_mb'] - base['memory_mb']
+        slower = throughputChange < -threshold and result['seconds'] - base['seconds'] > TIME_FLOOR_SECONDS
+        regression = slower or (memoryChange > max(MEMORY_FLOOR_MB, threshold*base['memory_mb']))
+        rows.append({'case': case, 'throughput_change': throughputChange, 'memory_change_mb': memoryChange, 'regression': regression})
+    return pd.DataFrame(rows, columns=['case', 'throughput_change', 'memory_change_mb', 'regression']).set_index('case')
+
+def format_results(report):
+    lines = [f'{"case":<14} {"items":>10} {"seconds":>9} {"median":>9} {"items/s":>11} {"memory MB":>10}']
+    for case, result in report['results'].items():
+        lines.append(f'{case:<14} {result["items"]:>10} {result["seconds"]:>9.3f} {result["median_seconds"]:>9.3f} '
+                     f'{result["throughput"]:>11.0f} {result["memory_mb"]:>10.1f}')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic data.')
+    parser.add_argument('--speeches', type=int, default=100000, help='number of synthetic speeches (ridings and documents scale with it)')
+    parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES, help='cases to run')
+    parser.add_argument('--workers', type=int, default=1, help='processes used by the cleaning stages')
+    parser.add_argument('--data-dir', help='keep the synthetic data in this directory and reuse it across runs')
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='timed runs of each case; the fastest is compared')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results to a json baseline')
+    parser.add_argument('--compare', metavar='PATH', help='json baseline to compare the results with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change flagged as a regression')
+    args = parser.parse_args()
+
+    report = run(args.speeches, args.cases, args.workers, args.data_dir, repeats=args.repeats)
+    print(format_results(report))
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline['scale'] != report['scale']:
+            print(f'warning: baseline was run at {baseline["scale"]}, not {report["scale"]}', file=sys.stderr)
+        changes = compare(report, baseline, args.threshold)
+        print()
+        print(changes.to_string(formatters={'throughput_change': '{:+.1%}'.format, 'memory_change_mb': '{:+.1f}'.format}))
+        sys.exit(1 if changes.regression.any() else 0)
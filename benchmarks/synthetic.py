@@ -0,0 +1,186 @@
+""" Generate synthetic lipad-style data so the pipeline can be timed without the private Hansard corpus. """
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import CONTRACTIONS
+
+WORDS = ['budget', 'health', 'care', 'tax', 'taxes', 'jobs', 'economy', 'quebec', 'ontario', 'alberta',
+    'environment', 'climate', 'carbon', 'pipeline', 'veterans', 'families', 'seniors', 'pension', 'pensions',
+    'committee', 'report', 'legislation', 'justice', 'crime', 'immigration', 'agriculture', 'farmers',
+    'fisheries', 'forestry', 'energy', 'infrastructure', 'transit', 'housing', 'affordable', 'employment',
+    'insurance', 'federal', 'provincial', 'municipal', 'communities', 'rural', 'northern', 'aboriginal',
+    'first', 'nations', 'military', 'afghanistan', 'mission', 'trade', 'agreement', 'softwood', 'lumber',
+    'the', 'and', 'of', 'to', 'that', 'we', 'this', 'is', 'in', 'for', 'on', 'have', 'are', 'it', 'with',
+    'government', 'minister', 'member', 'house', 'speaker', 'bill', 'motion', 'question', 'canadians',
+    'élection', 'québécois', 'montréal', 'opportunity', 'responsibility', 'accountability', 'programs']
+PUNCTUATION = ['', '', '', '', ',', '.', '?', '!', ';', ':', '"', '(', ')', '-', '--', '...']
+
+def _join_words(words, lengths):
+    """ Split a flat array of words into consecutive speeches of the given lengths and join each with spaces. """
+    bounds = np.concatenate([[0], np.cumsum(lengths)])
+    words = words.tolist()
+    return [' '.join(words[start:end]) for start, end in zip(bounds[:-1], bounds[1:])]
+
+def make_speeches(n, mean_words=120, seed=0):
+    """ Generate n synthetic speeches with lengths drawn around mean_words.
+
+        Words are drawn in bulk with numpy so that millions of speeches can be generated: 5% contractions,
+        3% numbers, and vocabulary otherwise, 10% capitalized, with trailing punctuation or line breaks.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = np.maximum(1, rng.exponential(mean_words, n).astype(int))
+    total = int(lengths.sum())
+
+    base = WORDS + list(CONTRACTIONS) + [str(i) for i in range(1, 2021)]
+    kind = rng.random(total)
+    index = np.where(kind < 0.05, len(WORDS) + rng.integers(0, len(CONTRACTIONS), total),
+                     np.where(kind < 0.08, len(WORDS) + len(CONTRACTIONS) + rng.integers(0, 2020, total),
+                              rng.integers(0, len(WORDS), total)))
+    capitalized = rng.random(total) < 0.1
+    endings = PUNCTUATION + ['\n']
+    ending = rng.integers(0, len(endings), total)
+    # every spelling of every word is built once and speeches index into them, so no string is made per word
+    spellings = np.array([w + e for word in base for w in (word, word.capitalize()) for e in endings], dtype=object)
+    words = spellings[(2*index + capitalized)*len(endings) + ending]
+    return _join_words(words, lengths)
+
+PROVINCES = ['Ontario', 'Quebec', 'British Columbia', 'Alberta', 'Manitoba', 'Saskatchewan', 'Nova Scotia',
+    'New Brunswick', 'Newfoundland and Labrador', 'Prince Edward Island', 'Yukon', 'Northwest Territories', 'Nunavut']
+FIRST_NAMES = ['Jack', 'Stephen', 'Paul', 'Elizabeth', 'Gilles', 'Justin', 'Thomas', 'Rona', 'Bob', 'Cathy',
+    'Michael', 'Patricia', 'Joe', 'Bradley', 'Megan', 'Pierre', 'Jean', 'Marie', 'Olivia', 'Peter']
+LAST_NAMES = ['Layton', 'Harper', 'Martin', 'May', 'Duceppe', 'Trudeau', 'Mulcair', 'Ambrose', 'Rae', 'McLeod',
+    'Chong', 'Hajdu', 'Scheer', 'Trost', 'Leslie', 'Poilievre', 'Charest', 'Tremblay', 'Chow', 'MacKay']
+# party as written in the candidate label, including the conventions that fall through to Other
+CANDIDATE_PARTIES = ['Liberal', 'Conservative', 'NDP-New Democratic Party', 'N.D.P.', 'Bloc Québécois',
+    'Green Party', 'Independent', 'Marxist-Leninist', 'Libertarian', 'Christian Heritage Party']
+
+def make_mp_name(rng):
+    """ Random (first name, surname) pair. """
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+def make_election(n_ridings, labels, seed=0, candidates=(3, 7)):
+    """ Generate candidate-level results for one federal election under a schema of column labels.
+
+        Args: n_ridings: number of ridings
+              labels: riding, candidate, vote share, majority, and province column labels, as in join_data.LABEL_MAP
+              candidates: range of candidates per riding
+        Returns: df with one row per candidate; only each riding's winner has a majority value
+    """
+    rng = random.Random(seed)
+    ridingLabel, candidateLabel, voteObtainedLabel, majorityLabel, provinceLabel = labels
+    # built column by column rather than as a dict per row, to keep large elections small
+    columns = {label: [] for label in labels}
+    for r in range(n_ridings):
+        riding = f'Riding {r}'
+        province = rng.choice(PROVINCES)
+        n = rng.randint(*candidates)
+        weights = [rng.random() for _ in range(n)]
+        shares = sorted((round(100*w/sum(weights), 1) for w in weights), reverse=True)
+        order = list(range(n))
+        rng.shuffle(order)
+        for i in order:
+            first, surname = make_mp_name(rng)
+            columns[ridingLabel].append(riding)
+            columns[candidateLabel].append(f'{surname}, {first} {rng.choice(CANDIDATE_PARTIES)}')
+            columns[voteObtainedLabel].append(shares[i])
+            columns[majorityLabel].append(shares[0] - shares[1] if i == 0 else None)
+            columns[provinceLabel].append(province)
+    return pd.DataFrame(columns)
+
+def make_speakers(resultsByParty, n_unmatched=0, seed=0):
+    """ Embedding speakers for the elected MPs of riding results, plus speakers with no seat.
+
+        Returns: df with the speakername and parliamentNo columns built by join_data.main
+    """
+    rng = random.Random(seed)
+    speakers = []
+    for mp, parl in zip(resultsByParty.MP, resultsByParty.ParliamentNo):
+        surname, _, rest = mp.partition(', ')
+        speakers.append({'speakername': f'{rest.split(" ")[0]} {surname}', 'parliamentNo': str(parl)})
+    for _ in range(n_unmatched):
+        speakers.append({'speakername': ' '.join(make_mp_name(rng)) + 'son', 'parliamentNo': str(rng.randint(38, 42))})
+    rng.shuffle(speakers)
+    return pd.DataFrame(speakers)
+
+PARTY_NAMES = ['Liberal', 'Conservative', 'NDP', 'Bloc Québécois', 'Green']
+PARLIAMENTS = [38, 39, 40, 41, 42]
+
+def _make_mps(rng, n_mps):
+    """ (speakername, party, riding, Parliament) of n_mps synthetic MPs; names are unique. """
+    return [(' '.join(make_mp_name(rng)) + str(i), rng.choice(PARTY_NAMES), f'Riding {i}', rng.choice(PARLIAMENTS)) for i in range(n_mps)]
+
+# speeches generated and written at a time by write_corpus and write_parliaments, bounding their memory
+CHUNK_SIZE = 20000
+
+def _chunk_seed(seed, start):
+    """ Seed of the chunk of speeches from position start, distinct for every chunk of one corpus. """
+    return [seed, start]
+
+def make_corpus(n_speeches, n_mps=400, mean_words=80, seed=0, start=0):
+    """ Generate an already cleaned embeddings corpus in the tab-separated format written by preprocessing.main.
+
+        start is the position of the first speech, to generate a large corpus chunk by chunk; see write_corpus.
+
+        Returns: df with the ten partyembed columns; write with to_csv(sep='\t', index=False, header=False)
+    """
+    mps = pd.DataFrame(_make_mps(random.Random(seed), n_mps), columns=['speakername', 'speakerparty', 'riding', 'Parliament'])
+    rng = np.random.default_rng(_chunk_seed(seed, start))
+    stems = np.array(sorted({w[:6] for w in WORDS if len(w) > 2}), dtype=object)
+    lengths = rng.exponential(mean_words, n_speeches).astype(int)
+    text = _join_words(stems[rng.integers(0, len(stems), int(lengths.sum()))], lengths)
+
+    speakers = mps.iloc[rng.integers(0, n_mps, n_speeches)].reset_index(drop=True)
+    return pd.DataFrame({0: speakers.Parliament, 1: np.arange(start, start + n_speeches), 2: text, 3: 'pid' + speakers.speakername,
+                         4: speakers.speakername, 5: 'HoC', 6: speakers.riding, 7: speakers.speakerparty, 8: 'Liberal', 9: 0})
+
+def write_corpus(path, n_speeches, seed=0, chunksize=CHUNK_SIZE):
+    """ Write make_corpus(n_speeches) to path, chunksize speeches at a time, so memory does not grow with n_speeches. """
+    for start in range(0, max(n_speeches, 1), chunksize):
+        make_corpus(min(chunksize, n_speeches - start), seed=seed, start=start).to_csv(
+            path, sep='\t', index=False, header=False, mode='w' if start == 0 else 'a')
+
+def make_parliament_speeches(n_speeches, parliament, n_mps=400, mean_words=120, seed=0, start=0):
+    """ Generate the speeches of one Parliament in the {parliament number}Parl format written by remove_unecessary_speakers.
+
+        start is the position of the first speech, to generate a large Parliament chunk by chunk; see write_parliaments.
+    """
+    mps = _make_mps(random.Random(seed), n_mps)
+    rng = random.Random(str(_chunk_seed(seed, start)))
+    speakers = [rng.choice(mps) for _ in range(n_speeches)]
+    return pd.DataFrame({'basepk': [f'{parliament}{i:08d}' for i in range(start, start + n_speeches)],
+                         'speechdate': f'{1966 + 2*parliament}-01-01',
+                         'speechtext': make_speeches(n_speeches, mean_words, seed=_chunk_seed(seed, start)),
+                         'pid': [f'pid{name}' for name, _, _, _ in speakers],
+                         'speakeroldname': [f'Mr. {name}' for name, _, _, _ in speakers],
+                         'speakername': [name for name, _, _, _ in speakers],
+                         'speakerriding': [riding for _, _, riding, _ in speakers],
+                         'speakerparty': [party for _, party, _, _ in speakers],
+                         'maintopic': 'Government Orders'},
+                        index=pd.RangeIndex(start, start + n_speeches))
+
+def write_parliaments(root, n_speeches, seed=0, chunksize=CHUNK_SIZE):
+    """ Write {parliament number}Parl.csv files for the Parliaments read by preprocessing.main, n_speeches in total.
+
+        Each file is appended chunksize speeches at a time, so memory does not grow with n_speeches.
+    """
+    os.makedirs(root, exist_ok=True)
+    for i, parliament in enumerate(PARLIAMENTS):
+        n = n_speeches//len(PARLIAMENTS) + (i < n_speeches % len(PARLIAMENTS))
+        path = os.path.join(root, f'{parliament}Parl.csv')
+        for start in range(0, max(n, 1), chunksize):
+            make_parliament_speeches(min(chunksize, n - start), parliament, seed=seed + parliament, start=start).to_csv(
+                path, mode='w' if start == 0 else 'a', header=start == 0)
+
+def make_embeddings(n_documents, dimensions=200, n_axes=4, seed=0):
+    """ Doc2Vec-like document vectors: a few latent ideological axes plus noise, as float32 like gensim's.
+
+        Returns: (array of shape (n_documents, dimensions), list of 'FirstName LastName_PartyName_ParliamentNo' labels)
+    """
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(size=(n_axes, dimensions))
+    vectors = rng.normal(size=(n_documents, n_axes)) @ loadings + 0.5*rng.normal(size=(n_documents, dimensions))
+    labels = [f'{name}_{party}_{parliament}' for name, party, _, parliament in _make_mps(random.Random(seed), n_documents)]
+    return vectors.astype(np.float32), labels
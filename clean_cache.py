@@ -0,0 +1,110 @@
+import argparse
+import hashlib
+import sqlite3
+
+class CleanCache:
+    """ On-disk cache of cleaned speeches keyed by speech ID (basepk) and the cleaning configuration hash.
+
+        A cached speech is reused only when the hash of its raw text is unchanged, so new or edited speeches
+        are re-cleaned and everything else is read back from the SQLite file.
+
+        Args: path: SQLite file holding the cache
+              config: fingerprint of the cleaning configuration, e.g. TextCleaner.fingerprint()
+    """
+    # number of IDs looked up per query, below SQLite's default limit on bound parameters
+    BATCH = 900
+
+    def __init__(self, path, config):
+        self.path = path
+        self.config = config
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS speeches (
+            config TEXT NOT NULL, basepk TEXT NOT NULL, digest TEXT NOT NULL, cleaned TEXT NOT NULL,
+            PRIMARY KEY (config, basepk)) WITHOUT ROWID''')
+
+    @staticmethod
+    def digest(text):
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def _lookup(self, ids):
+        found = {}
+        for i in range(0, len(ids), self.BATCH):
+            batch = ids[i:i+self.BATCH]
+            query = f'SELECT basepk, digest, cleaned FROM speeches WHERE config=? AND basepk IN ({",".join("?"*len(batch))})'
+            for basepk, digest, cleaned in self.conn.execute(query, [self.config] + batch):
+                found[basepk] = (digest, cleaned)
+        return found
+
+    def clean(self, speech_ids, texts, clean_fn):
+        """ Return cleaned speeches, cleaning only those missing from the cache or whose text changed.
+
+            Args: speech_ids: basepk of each speech
+                  texts: raw text of each speech
+                  clean_fn: function taking a list of raw texts and returning their cleaned versions
+            Returns: list of cleaned strings in input order
+        """
+        ids = [str(i) for i in speech_ids]
+        texts = list(texts)
+        digests = [self.digest(t) for t in texts]
+        found = self._lookup(list(set(ids)))
+
+        result = [None]*len(texts)
+        missing = []
+        for i, (basepk, digest) in enumerate(zip(ids, digests)):
+            cached = found.get(basepk)
+            if cached is not None and cached[0] == digest:
+                result[i] = cached[1]
+            else:
+                missing.append(i)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            cleaned = clean_fn([texts[i] for i in missing])
+            for i, text in zip(missing, cleaned):
+                result[i] = text
+            self.conn.executemany('INSERT OR REPLACE INTO speeches VALUES (?, ?, ?, ?)',
+                [(self.config, ids[i], digests[i], text) for i, text in zip(missing, cleaned)])
+            self.conn.commit()
+        return result
+
+    def configs(self):
+        """ Return a dict of configuration hash -> number of cached speeches. """
+        return dict(self.conn.execute('SELECT config, COUNT(*) FROM speeches GROUP BY config'))
+
+    def compact(self, keep=None):
+        """ Evict speeches cleaned under any configuration other than keep (default: this cache's) and shrink the file.
+
+            Returns: number of evicted speeches
+        """
+        keep = keep or self.config
+        evicted = self.conn.execute('DELETE FROM speeches WHERE config != ?', (keep,)).rowcount
+        self.conn.commit()
+        self.conn.execute('VACUUM')
+        return evicted
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = self.hits/total if total else 0.0
+        return f'clean cache {self.path}: {self.hits} hits, {self.misses} misses ({rate:.1%} hit rate)'
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == '__main__':
+    from preprocessing import TextCleaner
+
+    parser = argparse.ArgumentParser(description='Inspect or compact the cleaned speech cache.')
+    parser.add_argument('command', choices=['stats', 'compact'], help='list cached configurations, or evict stale ones')
+    parser.add_argument('--cache', default='clean_cache.sqlite', help='path of the cache file')
+    args = parser.parse_args()
+
+    cache = CleanCache(args.cache, TextCleaner().fingerprint())
+    if args.command == 'compact':
+        print(f'evicted {cache.compact()} speeches cleaned under stale configurations')
+    for config, count in cache.configs().items():
+        print(f'{config}\t{count}' + ('\t(current)' if config == cache.config else ''))
+    cache.close()
@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from preprocessing import Vocabulary
+from storage import CORPUS_CSV_READ, iter_table
+
+# Doc2Vec parameters of train, overridable from the command line. These are not taken from partyembed's
+# partyembeddings_house.py, which trains the pipeline's model; train also tags each speech with its speaker alone,
+# so its models are for experiments on the streamed corpus and are not interchangeable with the pipeline's
+DOC2VEC_PARAMS = {'vector_size': 200, 'window': 20, 'min_count': 50, 'epochs': 5}
+
+def build_token_corpus(path='data/38to42Parl_forembeddings.csv', prefix='data/38to42Parl_tokens', chunksize=500000):
+    """ Convert the embeddings corpus into a memory-mappable token ID corpus for Doc2Vec.
+
+        The corpus is read in chunks of chunksize speeches, so memory does not grow with the corpus. Each speech
+        becomes a run of int32 token IDs tagged 'FirstName LastName_PartyName_ParliamentNo', as in join_data.
+
+        Args: path: embeddings corpus written by preprocessing.main, tab-separated or columnar
+              prefix: path prefix of the output files: {prefix}.ids (token IDs of every speech, back to back),
+                      {prefix}.offsets.npy (start of each speech in .ids, and the end of the last), {prefix}.tags.npy
+                      and {prefix}.parliaments.npy (tag index and Parliament of each speech), {prefix}.vocab.json,
+                      and {prefix}.meta.json, written last so an interrupted build is never read
+              chunksize: speeches read at a time
+        Returns: number of speeches
+    """
+    if os.path.exists(f'{prefix}.meta.json'):
+        os.remove(f'{prefix}.meta.json')
+    vocabulary = Vocabulary()
+    tagIndex = {}
+    lengths, docTags, docParliaments = [], [], []
+    reader = iter_table(path, chunksize, columns=['Parliament', 'speechtext', 'speakername', 'speakerparty'],
+                        dtype={'speechtext': str, 'speakername': str, 'speakerparty': str}, **CORPUS_CSV_READ)
+    with open(f'{prefix}.ids', 'wb') as f:
+        for chunk in reader:
+            # an empty speech is read back as a missing value
+            encoded = [vocabulary.encode(text.split()) for text in chunk.speechtext.fillna('')]
+            if encoded:
+                np.concatenate(encoded).astype(np.int32).tofile(f)
+            lengths.append(np.array([len(ids) for ids in encoded], dtype=np.int64))
+
+            tags = chunk.speakername + '_' + chunk.speakerparty + '_' + chunk.Parliament.astype(str)
+            docTags.append(np.array([tagIndex.setdefault(tag, len(tagIndex)) for tag in tags], dtype=np.int32))
+            docParliaments.append(chunk.Parliament.to_numpy(dtype=np.int16))
+
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+    np.save(f'{prefix}.offsets.npy', np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+    np.save(f'{prefix}.tags.npy', np.concatenate(docTags) if docTags else np.zeros(0, dtype=np.int32))
+    np.save(f'{prefix}.parliaments.npy', np.concatenate(docParliaments) if docParliaments else np.zeros(0, dtype=np.int16))
+    vocabulary.save(f'{prefix}.vocab.json')
+    with open(f'{prefix}.meta.json', 'w') as f:
+        json.dump({'documents': len(lengths), 'words': int(lengths.sum()), 'tags': list(tagIndex)}, f)
+    return len(lengths)
+
+class TokenCorpus:
+    """ Re-iterable stream of gensim TaggedDocuments read from a token corpus on disk, at constant memory.
+
+        Every iteration starts again from the start position, so gensim can run several epochs over it. Token IDs
+        are memory-mapped and only decoded to words one speech at a time.
+
+        Args: prefix: path prefix given to build_token_corpus
+              parliaments: only iterate over speeches of these Parliament numbers; None for all
+              start: position of the first speech to yield, e.g. to resume an interrupted pass
+    """
+    def __init__(self, prefix, parliaments=None, start=0):
+        with open(f'{prefix}.meta.json') as f:
+            meta = json.load(f)
+        self.prefix = prefix
+        self.parliaments = parliaments
+        self.start = start
+        self.tags = meta['tags']
+        self.words = np.array(Vocabulary.load(f'{prefix}.vocab.json').tokens(), dtype=object)
+        self.ids = np.memmap(f'{prefix}.ids', dtype=np.int32, mode='r') if meta['words'] else np.zeros(0, dtype=np.int32)
+        self.offsets = np.load(f'{prefix}.offsets.npy', mmap_mode='r')
+        self.docTags = np.load(f'{prefix}.tags.npy', mmap_mode='r')
+        docParliaments = np.load(f'{prefix}.parliaments.npy', mmap_mode='r')
+        if parliaments is None:
+            self.documents = np.arange(meta['documents'])
+        else:
+            self.documents = np.flatnonzero(np.isin(docParliaments, parliaments))
+
+    def __len__(self):
+        return max(0, len(self.documents) - self.start)
+
+    def __iter__(self):
+        from gensim.models.doc2vec import TaggedDocument
+        words, ids, offsets, docTags, tags = self.words, self.ids, self.offsets, self.docTags, self.tags
+        for d in self.documents[self.start:]:
+            yield TaggedDocument(words[ids[offsets[d]:offsets[d+1]]].tolist(), [tags[docTags[d]]])
+
+    def total_words(self):
+        """ Number of tokens in the speeches iterated over. """
+        documents = self.documents[self.start:]
+        return int((self.offsets[documents + 1] - self.offsets[documents]).sum())
+
+    def available_parliaments(self):
+        """ Parliament numbers present in the corpus. """
+        return sorted(int(p) for p in np.unique(np.load(f'{self.prefix}.parliaments.npy', mmap_mode='r')))
+
+    def shard(self, parliament):
+        """ Corpus of the speeches of one Parliament. """
+        return TokenCorpus(self.prefix, [parliament])
+
+    def resume(self, position):
+        """ The same corpus, starting from the speech at position. """
+        return TokenCorpus(self.prefix, self.parliaments, position)
+
+def train(prefix, output, parliaments=None, workers=4, **params):
+    """ Train a Doc2Vec model streaming from a token corpus and save it to output.
+
+        Args: prefix: path prefix given to build_token_corpus
+              output: path of the saved model
+              parliaments: only train on these Parliament numbers; None for all
+              workers: gensim worker threads
+              params: Doc2Vec parameters overriding DOC2VEC_PARAMS
+        Returns: output
+    """
+    from gensim.models.doc2vec import Doc2Vec
+    corpus = TokenCorpus(prefix, parliaments)
+    model = Doc2Vec(workers=workers, **dict(DOC2VEC_PARAMS, **params))
+    model.build_vocab(corpus)
+    model.train(corpus, total_examples=len(corpus), total_words=corpus.total_words(), epochs=model.epochs)
+    model.save(output)
+    return output
+
+def train_by_parliament(prefix, output, parliaments=None, jobs=2, workers=4, **params):
+    """ Train one Doc2Vec model per Parliament in parallel processes, saved to {output}_{parliament number}.
+
+        Returns: list of saved model paths
+    """
+    parliaments = parliaments or TokenCorpus(prefix).available_parliaments()
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(train, prefix, f'{output}_{p}', [p], workers, **params) for p in parliaments]
+        return [future.result() for future in futures]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a memory-mapped token corpus and train Doc2Vec models from it.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help='convert the embeddings corpus into a token ID corpus')
+    build.add_argument('--corpus', default='data/38to42Parl_forembeddings.csv', help='embeddings corpus, csv or parquet')
+    build.add_argument('--prefix', default='data/38to42Parl_tokens', help='path prefix of the token corpus files')
+    build.add_argument('--chunksize', type=int, default=500000, help='speeches read at a time')
+    fit = subparsers.add_parser('train', help='train Doc2Vec from the token corpus')
+    fit.add_argument('--prefix', default='data/38to42Parl_tokens', help='path prefix of the token corpus files')
+    fit.add_argument('--output', default='data/38to42Parl_tokens_model', help='saved model; suffixed with _{parliament} per Parliament')
+    fit.add_argument('--parliaments', type=int, nargs='+', help='only train on these Parliaments')
+    fit.add_argument('--by-parliament', action='store_true', help='train one model per Parliament, in parallel')
+    fit.add_argument('--jobs', type=int, default=2, help='models trained at once with --by-parliament')
+    fit.add_argument('--workers', type=int, default=4, help='gensim worker threads per model')
+    for name, default in DOC2VEC_PARAMS.items():
+        fit.add_argument(f'--{name.replace("_", "-")}', type=int, default=default, help=f'Doc2Vec {name}')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        n = build_token_corpus(args.corpus, args.prefix, args.chunksize)
+        print(f'{n} speeches written to {args.prefix}.*')
+    else:
+        params = {name: getattr(args, name) for name in DOC2VEC_PARAMS}
+        if args.by_parliament:
+            paths = train_by_parliament(args.prefix, args.output, args.parliaments, args.jobs, args.workers, **params)
+        else:
+            paths = [train(args.prefix, args.output, args.parliaments, args.workers, **params)]
+        print('saved ' + ', '.join(paths))
@@ -0,0 +1,182 @@
+import argparse
+import csv
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from storage import read_table, write_table
+
+# riding, candidate, share of votes obtained, majority, and province column labels of each known layout of
+# election result files; the layout of a file is detected from its header
+ELECTION_SCHEMAS = {
+    'federal_2004': ['District', 'Candidate', 'Number of Votes Percent', 'Majority Percent', 'Province'],
+    'federal_2006': ['Electoral District/Circonscription', 'Candidate/Candidat', 'Percentage of Votes Obtained /Pourcentage des votes obtenus', 'Majority Percentage/Pourcentage de majorité', 'Province'],
+    'federal_2008': ['Electoral District Name/Nom de circonscription', 'Candidate/Candidat', 'Percentage of Votes Obtained /Pourcentage des votes obtenus', 'Majority Percentage/Pourcentage de majorité', 'Province'],
+}
+
+ELECTIONS_DIR = 'data/electionResults'
+# optional json of schema name -> five column labels, adding layouts without code changes
+SCHEMAS_PATH = 'data/election_schemas.json'
+# optional csv in the elections directory with the file, parliament, and optionally jurisdiction and schema of each file
+MANIFEST = 'elections.csv'
+CACHE_DIR = 'data/election_cache'
+# Parliament number at the start of a file name not listed in the manifest, e.g. '38Election.csv' or '42_results.csv'
+PARLIAMENT_PATTERN = re.compile(r'^(\d{2})(?!\d)')
+# source files whose changes invalidate cached results
+LOADER_CODE = ['elections.py', 'join_data.py']
+
+ElectionFile = namedtuple('ElectionFile', ['path', 'parliament', 'jurisdiction', 'schema'])
+
+def load_schemas(path=SCHEMAS_PATH):
+    """ The built-in ELECTION_SCHEMAS plus those of the json file at path, if it exists. """
+    schemas = dict(ELECTION_SCHEMAS)
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            schemas.update(json.load(f))
+    return schemas
+
+def decode(data):
+    """ Text and encoding of a result file: utf-8 (dropping a byte order mark), or latin-1 if it is not utf-8. """
+    try:
+        return data.decode('utf-8-sig'), 'utf-8'
+    except UnicodeDecodeError:
+        return data.decode('latin-1'), 'latin-1'
+
+def detect_schema(header, schemas):
+    """ Name of the first schema whose five labels are all columns of header, or None. """
+    columns = {column.strip() for column in header}
+    for name, labels in schemas.items():
+        if all(label in columns for label in labels):
+            return name
+    return None
+
+def parliament_of(path):
+    """ Parliament number a file name starts with, e.g. 38 for '38Election.csv'; None if it starts otherwise. """
+    match = PARLIAMENT_PATTERN.match(os.path.basename(path))
+    return int(match.group(1)) if match else None
+
+def _read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    manifest = pd.read_csv(path, dtype=str).fillna('')
+    return {row.file: row for row in manifest.itertuples()}
+
+def find_elections(directory=ELECTIONS_DIR):
+    """ Result files of a directory with the Parliament and jurisdiction of each.
+
+        The Parliament comes from the manifest if it lists the file, otherwise from the two digits the file name
+        starts with (see PARLIAMENT_PATTERN); a file with neither is an error rather than being numbered by position.
+
+        Returns: list of ElectionFile; schema is None unless the manifest names one
+    """
+    manifest = _read_manifest(directory)
+    paths = [fp for fp in glob.glob(os.path.join(directory, '*.csv')) if os.path.basename(fp) != MANIFEST]
+    files = []
+    for fp in paths:
+        row = manifest.get(os.path.basename(fp))
+        if row is not None:
+            files.append(ElectionFile(fp, int(row.parliament), getattr(row, 'jurisdiction', '') or 'federal',
+                                      getattr(row, 'schema', '') or None))
+        else:
+            files.append(ElectionFile(fp, parliament_of(fp), 'federal', None))
+
+    unknown = sorted(os.path.basename(f.path) for f in files if f.parliament is None)
+    if unknown:
+        raise ValueError(f'no Parliament number for {unknown}; list them in {os.path.join(directory, MANIFEST)}')
+    return files
+
+_LOADER_HASH = None
+
+def _loader_hash():
+    """ Hash of the code that normalizes result files, so cached results are rebuilt when it changes. """
+    global _LOADER_HASH
+    if _LOADER_HASH is None:
+        digest = hashlib.sha256()
+        for name in LOADER_CODE:
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as f:
+                digest.update(f.read())
+        _LOADER_HASH = digest.hexdigest()
+    return _LOADER_HASH
+
+def _cache_path(cache_dir, data, schemas, schema, election):
+    key = [_loader_hash(), sorted(schemas.items()), schema, election.parliament, election.jurisdiction]
+    digest = hashlib.sha256(json.dumps(key).encode('utf-8'))
+    digest.update(data)
+    return os.path.join(cache_dir, f'{digest.hexdigest()[:16]}.parquet')
+
+def load_election(election, schemas, cache_dir=CACHE_DIR):
+    """ Per-riding results of one election file, read from the cache if the file is unchanged.
+
+        Returns: df of generateElectionDataforRidings with a jurisdiction column
+    """
+    from join_data import generateElectionDataforRidings
+
+    with open(election.path, 'rb') as f:
+        data = f.read()
+    text, _ = decode(data)
+    schema = election.schema or detect_schema(next(csv.reader(io.StringIO(text)), []), schemas)
+    if schema is None:
+        raise ValueError(f'{election.path}: no election schema matches its columns; add one to {SCHEMAS_PATH}')
+    labels = schemas[schema]
+
+    cached = _cache_path(cache_dir, data, schemas, schema, election) if cache_dir else None
+    if cached and os.path.exists(cached):
+        results = read_table(cached)
+        results['MP'] = results.MP.fillna(0)
+        return results
+
+    rawElection = pd.read_csv(io.StringIO(text))
+    rawElection.columns = [column.strip() for column in rawElection.columns]
+    results = generateElectionDataforRidings(rawElection, election.parliament, labels)
+    results['jurisdiction'] = election.jurisdiction
+    if cached:
+        os.makedirs(cache_dir, exist_ok=True)
+        # ridings without an elected MP hold 0, which is stored as missing to keep the column all strings
+        write_table(results.assign(MP=results.MP.where(results.MP.map(lambda mp: isinstance(mp, str)))), cached)
+    return results
+
+def load_elections(directory=ELECTIONS_DIR, jurisdiction='federal', cache_dir=CACHE_DIR, workers=8, schemas_path=SCHEMAS_PATH):
+    """ Per-riding results of every election of a jurisdiction, loaded concurrently and ordered by Parliament.
+
+        Each file's encoding and schema are detected from its content and header, and its normalized results are
+        cached as parquet under cache_dir, keyed by the file's content, the schemas, and the loader code (see
+        LOADER_CODE), so unchanged files are not parsed again.
+
+        Args: directory: folder of result csv files, with an optional elections.csv manifest
+              jurisdiction: only return elections of this jurisdiction, e.g. 'federal'
+              cache_dir: directory of cached results; None to always parse the files
+              workers: number of files loaded at once
+              schemas_path: json file of extra schemas, see load_schemas
+        Returns: df of riding results of every election with a ParliamentNo column
+    """
+    schemas = load_schemas(schemas_path)
+    files = [f for f in find_elections(directory) if f.jurisdiction == jurisdiction]
+    parliaments = [f.parliament for f in files]
+    duplicated = sorted({p for p in parliaments if parliaments.count(p) > 1})
+    if duplicated:
+        raise ValueError(f'several {jurisdiction} election files for Parliaments {duplicated} in {directory}')
+
+    files = sorted(files, key=lambda f: f.parliament)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda f: load_election(f, schemas, cache_dir), files))
+    if not results:
+        raise ValueError(f'no {jurisdiction} election files in {directory}')
+    return pd.concat(results, ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load, normalize, and cache election results by Parliament.')
+    parser.add_argument('--directory', default=ELECTIONS_DIR, help='folder of election result csv files')
+    parser.add_argument('--jurisdiction', default='federal', help='jurisdiction of the elections to load')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='directory of cached normalized results')
+    parser.add_argument('--workers', type=int, default=8, help='number of files loaded at once')
+    args = parser.parse_args()
+
+    resultsByParty = load_elections(args.directory, args.jurisdiction, args.cache_dir, args.workers)
+    print(resultsByParty.groupby('ParliamentNo').size().rename('ridings').to_string())
@@ -0,0 +1,144 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA, IncrementalPCA
+
+CACHE_DIR = 'data/embedding_cache'
+PCA_METHODS = ['full', 'randomized', 'incremental']
+# SVD solver of each PCA method, named in the cache so projections from different solvers are never mixed;
+# IncrementalPCA takes an exact SVD of each batch
+SVD_SOLVERS = {'full': 'full', 'randomized': 'randomized', 'incremental': 'full'}
+
+# model path -> size and modification time of its files and their content hash, so unchanged models are not re-read
+FINGERPRINTS = 'fingerprints.json'
+
+def _model_files(model_path):
+    """ A saved Doc2Vec model and the .npy arrays gensim stores next to large models. """
+    return [model_path] + sorted(glob.glob(f'{model_path}.*.npy'))
+
+def _hash_files(files, blocksize=1 << 20):
+    digest = hashlib.sha256()
+    for fp in files:
+        digest.update(os.path.basename(fp).encode('utf-8'))
+        with open(fp, 'rb') as f:
+            for block in iter(lambda: f.read(blocksize), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+def model_fingerprint(model_path, cache_dir=None):
+    """ Hash of a saved Doc2Vec model's content, including its .npy arrays.
+
+        With a cache_dir, the hash is stored there with the size and modification time of each file, and the
+        files are only read again when one of those changes.
+    """
+    files = _model_files(model_path)
+    if cache_dir is None:
+        return _hash_files(files)
+
+    stats = [[os.path.basename(fp), os.stat(fp).st_size, os.stat(fp).st_mtime_ns] for fp in files]
+    index = os.path.join(cache_dir, FINGERPRINTS)
+    fingerprints = {}
+    if os.path.exists(index):
+        with open(index) as f:
+            fingerprints = json.load(f)
+    key = os.path.abspath(model_path)
+    if fingerprints.get(key, {}).get('files') == stats:
+        return fingerprints[key]['hash']
+
+    fingerprints[key] = {'files': stats, 'hash': _hash_files(files)}
+    os.makedirs(cache_dir, exist_ok=True)
+    # replaced in one step, so a concurrent reader never sees a partial index
+    with open(f'{index}.{os.getpid()}', 'w') as f:
+        json.dump(fingerprints, f)
+    os.replace(f'{index}.{os.getpid()}', index)
+    return fingerprints[key]['hash']
+
+def extract_vectors(model):
+    """ Document vectors of a Doc2Vec model as one contiguous array, in the order of model.dv.index_to_key.
+
+        Returns: (array of shape (documents, dimensions), list of document labels)
+    """
+    return np.ascontiguousarray(model.dv.vectors), list(model.dv.index_to_key)
+
+def fit_pca(vectors, n_components=2, method='full', batch_size=10000, random_state=0):
+    """ Fit PCA to document vectors and project them.
+
+        Args: vectors: array of shape (documents, dimensions)
+              n_components: number of principal components
+              method: 'full' for an exact SVD, 'randomized' for a randomized SVD on large models, or 'incremental'
+                      to fit batch_size documents at a time
+        Returns: (fitted PCA, projected array of shape (documents, n_components))
+    """
+    if method == 'incremental':
+        pca = IncrementalPCA(n_components=n_components, batch_size=batch_size)
+    elif method == 'randomized':
+        pca = PCA(n_components=n_components, svd_solver=SVD_SOLVERS[method], random_state=random_state)
+    elif method == 'full':
+        # sklearn's default 'auto' solver would switch to a randomized SVD on large inputs
+        pca = PCA(n_components=n_components, svd_solver=SVD_SOLVERS[method])
+    else:
+        raise ValueError(f'unknown PCA method {method}, expected one of {PCA_METHODS}')
+    return pca, pca.fit_transform(vectors)
+
+def _ensure_cache(model_path, n_components, method, cache_dir):
+    """ Fill the cache entry of a model if it is missing and return its directory. """
+    path = os.path.join(cache_dir, f'{model_fingerprint(model_path, cache_dir)}_{method}_{SVD_SOLVERS[method]}_{n_components}')
+    if os.path.exists(os.path.join(path, 'labels.json')):
+        return path
+
+    from gensim.models.doc2vec import Doc2Vec
+    vectors, labels = extract_vectors(Doc2Vec.load(model_path))
+    pca, projection = fit_pca(vectors, n_components, method)
+
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'vectors.npy'), vectors)
+    np.save(os.path.join(path, 'components.npy'), pca.components_)
+    np.save(os.path.join(path, 'mean.npy'), pca.mean_)
+    np.save(os.path.join(path, 'explained_variance_ratio.npy'), pca.explained_variance_ratio_)
+    np.save(os.path.join(path, 'projection.npy'), projection)
+    # written last, so an interrupted run is never mistaken for a complete cache entry
+    with open(os.path.join(path, 'labels.json'), 'w') as f:
+        json.dump(labels, f)
+    return path
+
+def _load_labels(path):
+    with open(os.path.join(path, 'labels.json')) as f:
+        return json.load(f)
+
+def principal_components(model_path, n_components=2, method='full', cache_dir=CACHE_DIR):
+    """ Principal components of each document of a Doc2Vec model, cached by the hash of the model file.
+
+        On a cache miss the model is loaded, its vectors written to vectors.npy, and PCA fitted; the
+        components, mean, explained variance, and projection are stored as .npy files with a label index.
+        On a hit the projection is memory-mapped and the model is never loaded.
+
+        Args: model_path: saved Doc2Vec model
+              n_components: number of principal components
+              method: PCA method, see fit_pca
+              cache_dir: directory holding one subdirectory per (model hash, method, SVD solver, n_components)
+        Returns: df of pc1, pc2, ... indexed by document label ('FirstName LastName_PartyName_ParliamentNo')
+    """
+    path = _ensure_cache(model_path, n_components, method, cache_dir)
+    projection = np.load(os.path.join(path, 'projection.npy'), mmap_mode='r')
+    return pd.DataFrame(projection, index=_load_labels(path), columns=[f'pc{i+1}' for i in range(n_components)])
+
+def cached_vectors(model_path, n_components=2, method='full', cache_dir=CACHE_DIR):
+    """ Memory-mapped document vectors and labels from the cache of principal_components, filling it if needed. """
+    path = _ensure_cache(model_path, n_components, method, cache_dir)
+    return np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r'), _load_labels(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Extract Doc2Vec document vectors and cache their principal components.')
+    parser.add_argument('--model', default='data/38to42Parl', help='saved Doc2Vec model')
+    parser.add_argument('--components', type=int, default=2, help='number of principal components')
+    parser.add_argument('--method', choices=PCA_METHODS, default='full', help='PCA method')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='directory of cached projections')
+    args = parser.parse_args()
+
+    principalDf = principal_components(args.model, args.components, args.method, args.cache_dir)
+    print(f'{len(principalDf)} documents projected onto {args.components} components')
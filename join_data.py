@@ -1,94 +1,153 @@
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import pkg_resources
-import glob
-from gensim.models.doc2vec import Doc2Vec
-from sklearn.decomposition import PCA
-
-def generateElectionDataforRidings(rawElection, ParliamentNo):
-    """ Generate df of party share, province, and MP name for each riding for a single federal election. """
-    # deal with different labelling conventions across years
-    label_map = {38 : ['District', 'Candidate', 'Number of Votes Percent', 'Majority Percent', 'Province'], 
-          39 : ['Electoral District/Circonscription', 'Candidate/Candidat', 'Percentage of Votes Obtained /Pourcentage des votes obtenus',  'Majority Percentage/Pourcentage de majorité', 'Province'],
-          40 : ['Electoral District Name/Nom de circonscription','Candidate/Candidat', 'Percentage of Votes Obtained /Pourcentage des votes obtenus', 'Majority Percentage/Pourcentage de majorité', 'Province'], 
-          41 : ['Electoral District Name/Nom de circonscription','Candidate/Candidat', 'Percentage of Votes Obtained /Pourcentage des votes obtenus', 'Majority Percentage/Pourcentage de majorité', 'Province'], 
-          42 : ['Electoral District Name/Nom de circonscription','Candidate/Candidat', 'Percentage of Votes Obtained /Pourcentage des votes obtenus', 'Majority Percentage/Pourcentage de majorité', 'Province']}
-    ridingLabel, candidateLabel, voteObtainedLabel, majorityLabel, provinceLabel = label_map[ParliamentNo]
-
-    # create an empty df to store election results for each riding by party 
-    resultsByParty = pd.DataFrame()
-    resultsByParty['riding'] = list(set(rawElection.loc[:,ridingLabel]))
-    parties = ['NDP', 'Green', 'Bloc Quebecois', 'Liberal', 'Conservative', 'Other']
-
-    # fill the df with zeros
-    for p in parties:
-        resultsByParty[p+'_share'] = [0]*len(resultsByParty)
-
-    resultsByParty = resultsByParty.set_index('riding')
-
-    # go through each candidate and put in their share of the vote in their riding and party position
-    for i in range(len(rawElection)):
-        if 'Liberal' in rawElection[candidateLabel][i]:
-            resultsByParty.loc[rawElection[ridingLabel][i],'Liberal_share'] += rawElection[voteObtainedLabel][i]
-        elif 'Conservative' in rawElection[candidateLabel][i]:
-            resultsByParty.loc[rawElection[ridingLabel][i],'Conservative_share'] += rawElection[voteObtainedLabel][i]
-        elif ('NDP' in rawElection[candidateLabel][i]) or ('N.D.P.' in rawElection[candidateLabel][i]):
-            resultsByParty.loc[rawElection[ridingLabel][i],'NDP_share'] += rawElection[voteObtainedLabel][i]
-        elif 'Bloc' in rawElection[candidateLabel][i]:
-            resultsByParty.loc[rawElection[ridingLabel][i],'Bloc Quebecois_share'] += rawElection[voteObtainedLabel][i]
-        elif 'Green' in rawElection[candidateLabel][i]:
-            resultsByParty.loc[rawElection[ridingLabel][i],'Green_share'] += rawElection[voteObtainedLabel][i]
-        else:
-            resultsByParty.loc[rawElection[ridingLabel][i],'Other_share'] += rawElection[voteObtainedLabel][i]
-
-    resultsByParty.loc[:,'province'] = [0]*len(resultsByParty)
-    for i, riding in enumerate(rawElection[ridingLabel]):
-        resultsByParty.loc[riding,'province'] = rawElection[provinceLabel][i]
+import os
+from embeddings import principal_components
+from storage import JOINED_SCHEMA, read_table, write_table
+from mp_matcher import MPMatcher, DEFAULT_ALIASES, load_aliases
+from elections import ELECTION_SCHEMAS, ELECTIONS_DIR, load_elections
+import profiling
+from profiling import instrument
+
+# deal with different labelling conventions across years
+# riding, candidate, share of votes obtained, majority, and province column labels of each federal election file
+LABEL_MAP = {38: ELECTION_SCHEMAS['federal_2004'],
+             39: ELECTION_SCHEMAS['federal_2006'],
+             40: ELECTION_SCHEMAS['federal_2008'],
+             41: ELECTION_SCHEMAS['federal_2008'],
+             42: ELECTION_SCHEMAS['federal_2008']}
+
+# optional alias table overriding mp_matcher.DEFAULT_ALIASES
+ALIASES_PATH = 'data/mp_aliases.csv'
+
+PARTIES = ['NDP', 'Green', 'Bloc Quebecois', 'Liberal', 'Conservative', 'Other']
+
+# substrings marking each party in a candidate label, checked in this order; anything else is Other
+PARTY_MARKERS = [('Liberal', ['Liberal']),
+                 ('Conservative', ['Conservative']),
+                 ('NDP', ['NDP', 'N.D.P.']),
+                 ('Bloc Quebecois', ['Bloc']),
+                 ('Green', ['Green'])]
+
+def party_of_candidate(label):
+    """ Party named in a single candidate label; a label naming several parties goes to the first in PARTY_MARKERS. """
+    for party, markers in PARTY_MARKERS:
+        if any(marker in label for marker in markers):
+            return party
+    return 'Other'
+
+@instrument(items=0)
+def classify_party(candidates):
+    """ Party of each candidate, classifying every distinct candidate label once.
+
+        Args: Series of candidate labels
+        Returns: array of party names from PARTIES
+    """
+    codes, labels = pd.factorize(candidates.astype(str))
+    # a code of -1 (missing label) picks the trailing Other
+    parties = np.array([party_of_candidate(label) for label in labels] + ['Other'], dtype=object)
+    return parties[codes]
+
+@instrument(items=0)
+def generateElectionDataforRidings(rawElection, ParliamentNo, labels=None):
+    """ Generate df of party share, province, and MP name for each riding for a single election.
+
+        labels are the riding, candidate, vote share, majority, and province columns; LABEL_MAP[ParliamentNo] by default.
+    """
+    ridingLabel, candidateLabel, voteObtainedLabel, majorityLabel, provinceLabel = labels or LABEL_MAP[ParliamentNo]
+    ridings = rawElection[ridingLabel].values
+
+    # sum each candidate's share of the vote into their riding and party position
+    shares = pd.DataFrame({'riding': ridings, 'party': classify_party(rawElection[candidateLabel]),
+                           'share': rawElection[voteObtainedLabel].values})
+    resultsByParty = shares.groupby(['riding', 'party'])['share'].sum().unstack(fill_value=0)
+    resultsByParty = resultsByParty.reindex(columns=PARTIES, fill_value=0)
+    resultsByParty.columns = [p+'_share' for p in PARTIES]
+
+    # province of the riding as given on its last candidate row
+    lastRows = rawElection.drop_duplicates(ridingLabel, keep='last').set_index(ridingLabel)
+    resultsByParty['province'] = lastRows[provinceLabel].reindex(resultsByParty.index).values
 
     # extract the elected MP's name and add to the df
     # note that only the elected MP's entry has a non-null value in the 'Majority' column
     # also generate a competitvenss score which is the difference between the first and second place candidates
-    resultsByParty.loc[:,'MP'] = [0]*len(resultsByParty)
-    resultsByParty.loc[:,'competitiveness'] = [0.0]*len(resultsByParty)
-
-    for i, riding in enumerate(rawElection[ridingLabel]):
-        if not pd.isna(rawElection[majorityLabel][i]):
-            tempname = rawElection[candidateLabel][i]
-            resultsByParty.loc[riding,'MP'] = tempname
-            resultsByParty.loc[riding,'competitiveness'] = rawElection[majorityLabel][i]
-
+    elected = rawElection[rawElection[majorityLabel].notna()].drop_duplicates(ridingLabel, keep='last')
+    elected = elected.set_index(ridingLabel)
+    resultsByParty['MP'] = elected[candidateLabel].reindex(resultsByParty.index).fillna(0).values
+    resultsByParty['competitiveness'] = elected[majorityLabel].reindex(resultsByParty.index).fillna(0.0).astype(float).values
 
     # include label for Parliament Number
-    resultsByParty.loc[:,'ParliamentNo'] = [ParliamentNo]*len(resultsByParty)
+    resultsByParty['ParliamentNo'] = ParliamentNo
+    resultsByParty.index.name = 'riding'
     resultsByParty = resultsByParty.reset_index()
     
     return resultsByParty
 
-def main():
-    # load the doc2vec model
-    # MODEL_PATH = pkg_resources.resource_filename('partyembed', 'models/')
-    model = Doc2Vec.load('data/38to42Parl')
-
-    # extract vectors from the embedding model and put it in a df
-    vectorlist = [model.dv[i] for i in range(0,len(model.dv.index_to_key))]
-    vectordf=pd.DataFrame(vectorlist)
-
-    # use Principle Component Analysis with two dimensions
+# parties of the goldstandard table, which holds one row per Parliament for each party in this order
+GOLD_PARTIES = ['Bloc Quebecois', 'Conservative', 'Liberal', 'NDP']
+GOLD_FIRST_PARLIAMENT = 38
+GOLD_PARLIAMENTS = 5
+
+def gold_matrix(gold, scoreNames, parties=GOLD_PARTIES, nParliaments=GOLD_PARLIAMENTS):
+    """ Reshape goldstandard scores into an array indexed by [Parliament, party, score].
+
+        Args: gold: goldstandard table ordered by party, then by Parliament within each party
+              scoreNames: score columns to keep, e.g. ['rile', 'vanilla', 'legacy']
+              parties: parties of the table, in order
+              nParliaments: number of Parliaments of each party
+        Returns: array of shape (nParliaments, number of parties, number of scores)
+    """
+    if len(gold) != len(parties)*nParliaments:
+        raise ValueError(f'goldstandard table has {len(gold)} rows, expected {nParliaments} Parliaments for each of {parties}')
+    values = gold[list(scoreNames)].values.astype(float)
+    return values.reshape(len(parties), nParliaments, len(scoreNames)).transpose(1, 0, 2)
+
+@instrument(items=0)
+def riding_ideology_scores(df, gold, scoreNames, parties=GOLD_PARTIES, firstParliament=GOLD_FIRST_PARLIAMENT,
+                           nParliaments=GOLD_PARLIAMENTS):
+    """ Proxy measures of riding ideology: goldstandard party scores weighted by each party's vote share.
+
+        Shares of parties without a goldstandard score (Green and Other) are left out of the denominator.
+
+        Args: df: rows with parliamentNo and {party}_share columns
+              gold: goldstandard table, see gold_matrix
+              scoreNames: score columns of gold to compute, e.g. ['rile', 'vanilla', 'legacy']
+        Returns: df of {score}Score columns aligned with df
+    """
+    matrix = gold_matrix(gold, scoreNames, parties, nParliaments)
+    parliamentNo = df['parliamentNo'].astype(int).values
+    parliament = parliamentNo - firstParliament
+    outside = (parliament < 0) | (parliament >= nParliaments)
+    if outside.any():
+        raise KeyError(f'no goldstandard scores for Parliaments {sorted(set(parliamentNo[outside]))}')
+    shares = df[[p+'_share' for p in parties]].values.astype(float)
+    denominator = 100 - df['Green_share'].values - df['Other_share'].values
+
+    # (rows x parties) shares times each row's (parties x scores) block of the goldstandard
+    scores = np.einsum('rp,rps->rs', shares, matrix[parliament]) / denominator[:, None]
+    return pd.DataFrame(scores, index=df.index, columns=[f'{name}Score' for name in scoreNames])
+
+@instrument
+def main(model_path='data/38to42Parl', speech_stats='data/speechStats.csv', output='allParliaments_joined.csv', pca_method='full'):
+    """ Join principal components, speech statistics, and riding election results for every MP.
+
+        Args: model_path: saved Doc2Vec model
+              pca_method: 'full', 'randomized', or 'incremental'; see embeddings.fit_pca
+              speech_stats: output of speech_stats.make_speech_statistics, csv or parquet
+              output: joined table; csv unless the extension names a columnar format such as .parquet
+    """
+    # extract the document vectors of the doc2vec model and project them onto two principal components
     # I'm using two dimensions because Rheault & Cochrane discovered meaningful dimensions with only two components
-    pca = PCA(n_components=2)
-    principalComponents = pca.fit_transform(vectordf)
-
-    # put PCA "ideal points" into df
-    principalDf = pd.DataFrame(data=principalComponents, columns=['pc1','pc2'])
-
-    # list of MPs in format: 'FirstName LastName_PartyName_ParliamentNo'
-    # make these the indices of the df
-    partylist = model.dv.index_to_key
-    principalDf.index = list(partylist)
+    # the projection is cached by the model's hash, so the model is only loaded when it changes
+    # list of MPs in format: 'FirstName LastName_PartyName_ParliamentNo' are the indices of the df
+    principalDf = principal_components(model_path, n_components=2, method=pca_method)
 
     # load statistics about speech length
-    speechStats = pd.read_csv('data/speechStats.csv', header=None, names=['speechFrequency', 'totalSpeechVolume'], index_col=0)
+    speechStats = read_table(speech_stats, header=None, names=['name_parl', 'speechFrequency', 'totalSpeechLength'])
+    speechStats = speechStats.set_index('name_parl').rename(columns={'totalSpeechLength': 'totalSpeechVolume'})
+    speechStats.index.name = None
     principalDf = principalDf.merge(speechStats, how='outer', right_index=True, left_index=True)
     principalDf.reset_index(inplace=True)
     principalDf.rename(columns={'index':'MP_party_parl'}, inplace=True)
@@ -103,40 +162,15 @@ def main():
     allParliaments = principalDf.drop(principalDf[principalDf.speakername=='CONGRESS'].index).reset_index(drop=True)
 
 
-    # Load all election results
-    files = glob.glob('data/electionResults/*.csv')
-
-    rawElections = []
-    for fp in files:
-        try:
-            rawElections += [pd.read_csv(fp)]
-        except:
-            rawElections += [pd.read_csv(fp, encoding='latin-1')]
+    # Load all federal election results, normalized per riding and keyed by Parliament number
+    resultsByParty = load_elections(ELECTIONS_DIR)
 
-    resultsByPartyList = [generateElectionDataforRidings(rawElections[i], 38+i) for i in range(len(rawElections))]
-    resultsByParty = pd.concat(resultsByPartyList, ignore_index=True)
-
-    # add new columns to dataframe
+    # add the riding results of each speaker's seat, matching speakers to elected MPs by Parliament and name
+    # exceptions for MPs whose ballot names differ were manually validated and live in the alias table
     newColumns = ['riding', 'province', 'Liberal_share', 'Conservative_share', 'NDP_share', 'Bloc Quebecois_share', 'Green_share', 'Other_share', 'competitiveness']
-    for label in newColumns:
-        allParliaments[label] = [0]*len(allParliaments)
-
-    # must make some exceptions for MPs with particular names
-    # these were manually validated
-    govtSupportMissingNames = ['Thomas', 'Bradley', 'Bob', 'Joe', 'Patricia', 'Michael']
-
-    for i, MP in enumerate(allParliaments.speakername):
-        for j, MpParty in enumerate(resultsByParty.MP):
-            # if the MP's first and last names are in the annoyingly formatted MP label and their Parliament numbers match
-            if (MP.partition(' ')[2] in MpParty) and (MP.partition(' ')[0] in MpParty) and (allParliaments.parliamentNo[i]==str(resultsByParty.ParliamentNo[j])): 
-                for label in newColumns:
-                    allParliaments.loc[i,label] = resultsByParty[label][j]
-
-            # handle the name exceptions
-            elif (MP.partition(' ')[2] in MpParty) and (MP.partition(' ')[0] in govtSupportMissingNames) and not ('Cathy' in MpParty) and (allParliaments.parliamentNo[i]==str(resultsByParty.ParliamentNo[j])): 
-                for label in newColumns:
-                    allParliaments.loc[i,label] = resultsByParty[label][j]
-                
+    aliases = load_aliases(ALIASES_PATH) if os.path.exists(ALIASES_PATH) else DEFAULT_ALIASES
+    allParliaments, matchReport = MPMatcher(resultsByParty, aliases).join(allParliaments, newColumns)
+    matchReport.to_csv('mp_match_report.csv', index=False)
 
     # drop MPs who were elected in by-elections, denoted by those whose ridings had no Liberal voters
     allParliaments.drop(allParliaments[allParliaments.Liberal_share == 0].index, inplace=True)
@@ -145,17 +179,9 @@ def main():
     # load goldstandard scores
     gold = pd.read_csv('data\modified_goldstandard_canada.csv')
 
-    # function to generate score given a row of a dataframe and the name of the score type, i.e., rile, vanilla, or legacy
-    def add_Score(MP, scoreName):
-        """ Generate score given a row of a dataframe and the name of the score type, i.e., rile, vanilla, or legacy. """
-        index_start = int(MP['parliamentNo'])-38
-        denominator =100-MP['Green_share']-MP['Other_share']
-        score = (gold[scoreName][index_start]*MP['Bloc Quebecois_share'] + gold[scoreName][index_start+5]*MP['Conservative_share'] + gold[scoreName][index_start+10]*MP['Liberal_share'] + gold[scoreName][index_start+15]*MP['NDP_share'])/denominator
-        return score
-
     # add columns to the dataframes
-    for tool in ['rile', 'vanilla', 'legacy']:
-        allParliaments[f'{tool}Score'] = allParliaments.apply(lambda row: add_Score(row, tool), axis=1)
+    scores = riding_ideology_scores(allParliaments, gold, ['rile', 'vanilla', 'legacy'])
+    allParliaments[scores.columns] = scores
 
     # rename columns
     allParliaments.rename(columns={'pc1':'quebecker', 'pc2':'govtSupport'}, inplace=True)
@@ -163,8 +189,12 @@ def main():
     # make higher government support positive
     allParliaments.loc[:,'govtSupport'] = allParliaments['govtSupport'].apply(lambda x: x*-1)
 
-    allParliaments.to_csv('allParliaments_joined.csv')
+    write_table(allParliaments, output, schema=JOINED_SCHEMA)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Join MP embeddings with speech statistics and riding election results.')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_arguments(args)
     main()
\ No newline at end of file
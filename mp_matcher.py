@@ -0,0 +1,105 @@
+import bisect
+import numpy as np
+import pandas as pd
+from profiling import instrument
+
+# Speakers whose name in Hansard differs from their name on the ballot; these were manually validated.
+# speaker_first_name: first name as it appears in the embedding labels
+# ballot_first_name: first name on the ballot; empty to match on surname alone
+# exclude: candidate label text that rules a candidate out, e.g. another MP sharing the surname; empty for none
+DEFAULT_ALIASES = pd.DataFrame({
+    'speaker_first_name': ['Thomas', 'Bradley', 'Bob', 'Joe', 'Patricia', 'Michael'],
+    'ballot_first_name': ['']*6,
+    'exclude': ['Cathy']*6})
+
+def load_aliases(path):
+    """ Load an alias table with the columns of DEFAULT_ALIASES from csv. """
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+class MPMatcher:
+    """ Match embedding speakers to the elected MP of each riding, by Parliament number and name.
+
+        A candidate matches a speaker 'FirstName LastName' of the same Parliament when their label contains both the
+        speaker's surname and first name, or the surname alone when the alias table allows it. Names are compared
+        as case-sensitive substrings, exactly as the manually validated name loop join_data.main used to run.
+        The labels of each Parliament are joined into one string, so the candidates containing a surname are found
+        with a few str.find calls rather than by comparing the speaker with every elected MP.
+
+        Args: resultsByParty: output of join_data.generateElectionDataforRidings for one or more elections
+              aliases: alias table with the columns of DEFAULT_ALIASES
+    """
+    def __init__(self, resultsByParty, aliases=DEFAULT_ALIASES):
+        self.results = resultsByParty.reset_index(drop=True)
+        self.aliases = {}
+        for row in aliases.itertuples(index=False):
+            self.aliases.setdefault(row.speaker_first_name, []).append((row.ballot_first_name, row.exclude))
+
+        # ridings without an elected MP hold 0 rather than a label
+        self.labels = [mp if isinstance(mp, str) else '' for mp in self.results.MP]
+        # Parliament -> (its labels joined by newlines, offset of each label in that text, result row of each label)
+        self.parliaments = {}
+        for parl, rows in self.results.groupby(self.results.ParliamentNo.astype(str)).indices.items():
+            offsets = np.cumsum([0] + [len(self.labels[j]) + 1 for j in rows[:-1]])
+            self.parliaments[parl] = ('\n'.join(self.labels[j] for j in rows), offsets, rows)
+
+    def _candidates(self, parl, surname):
+        """ Result rows of a Parliament whose label contains surname, in order. """
+        text, offsets, rows = self.parliaments.get(parl, ('', [], []))
+        if not surname:
+            return list(rows)
+        found = []
+        position = text.find(surname)
+        while position >= 0:
+            k = bisect.bisect_right(offsets, position) - 1
+            found.append(rows[k])
+            position = text.find(surname, offsets[k+1]) if k+1 < len(rows) else -1
+        return found
+
+    def _accepts(self, first, label):
+        """ Whether a candidate label containing the speaker's surname belongs to a speaker with this first name. """
+        if first in label:
+            return True
+        for ballot, exclude in self.aliases.get(first, []):
+            if (not ballot or ballot in label) and not (exclude and exclude in label):
+                return True
+        return False
+
+    @instrument(items=1)
+    def match(self, speakernames, parliamentNos):
+        """ Find the row of the results for each speaker.
+
+            Args: speakernames: 'FirstName LastName' of each speaker
+                  parliamentNos: Parliament number of each speaker
+            Returns: (matches, report) where matches is a Series of result row (or -1 if unmatched) aligned with
+                     the speakers, and report lists unmatched and ambiguous speakers with their candidate labels.
+                     An ambiguous speaker keeps the last candidate, as the original name loop did.
+        """
+        matches = []
+        report = []
+        for name, parl in zip(speakernames, parliamentNos):
+            first, _, surname = str(name).partition(' ')
+            candidates = self._candidates(str(parl), surname)
+            found = [j for j in candidates if self._accepts(first, self.labels[j])]
+            matches.append(found[-1] if found else -1)
+            if len(found) != 1:
+                report.append({'speakername': name, 'parliamentNo': parl,
+                               'status': 'ambiguous' if found else 'unmatched',
+                               'candidates': '; '.join(self.labels[j] for j in (found or candidates))})
+
+        matches = pd.Series(matches, index=getattr(speakernames, 'index', None), name='resultRow')
+        report = pd.DataFrame(report, columns=['speakername', 'parliamentNo', 'status', 'candidates'])
+        return matches, report
+
+    @instrument(items=1)
+    def join(self, allParliaments, columns):
+        """ Add the given result columns to each speaker's row in a single merge; unmatched speakers get 0.
+
+            Returns: (joined df, report of unmatched and ambiguous speakers)
+        """
+        matches, report = self.match(allParliaments.speakername, allParliaments.parliamentNo)
+        matched = matches[matches >= 0]
+        joinedColumns = self.results.loc[matched.values, columns].set_index(matched.index)
+        joined = allParliaments.drop(columns=[c for c in columns if c in allParliaments.columns])
+        joined = joined.join(joinedColumns)
+        joined[columns] = joined[columns].fillna(0)
+        return joined, report
@@ -0,0 +1,210 @@
+import argparse
+import csv
+import glob
+import hashlib
+import importlib
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from storage import table_format
+
+# A stage of the pipeline runs either target ('module:function', called with kwargs) or command (an argv list).
+# inputs and outputs are paths or glob patterns; code lists the source files whose changes invalidate the stage.
+Stage = namedtuple('Stage', ['name', 'target', 'kwargs', 'command', 'inputs', 'outputs', 'code', 'deps'])
+
+STATE_FILE = '.pipeline_state.json'
+METRICS_FILE = 'pipeline_metrics.csv'
+METRICS_COLUMNS = ['timestamp', 'stage', 'status', 'wall_seconds', 'peak_rss_mb', 'rows']
+
+SPEECHES_DIR = 'data/parliament_speeches'
+CORPUS = 'data/38to42Parl_forembeddings.csv'
+MODEL = 'data/38to42Parl'
+SPEECH_STATS = 'data/speechStats.csv'
+JOINED = 'data/allParliaments_joined.csv'
+# executed copy of plots.ipynb, so running the notebook never rewrites the tracked source
+PLOTS = 'data/plots_executed.ipynb'
+# csv outputs written without a header row
+HEADERLESS = [CORPUS, SPEECH_STATS]
+
+def default_stages(parliaments=(38, 39, 40, 41, 42)):
+    """ Stages of the workflow from raw lipad files to the joined table and plots, in dependency order. """
+    ingest = [Stage(f'ingest{n}', 'preprocessing:remove_unecessary_speakers', {'parlNo': n, 'output_dir': SPEECHES_DIR}, None,
+                    [f'{n}Parliament/**/**/*.csv'], [f'{SPEECHES_DIR}/{n}Parl.csv'], ['preprocessing.py', 'storage.py'], [])
+              for n in parliaments]
+    return ingest + [
+        Stage('preprocess', 'preprocessing:main', {'output': CORPUS}, None,
+              [f'{SPEECHES_DIR}/{n}Parl.csv' for n in parliaments], [CORPUS],
+              ['preprocessing.py', 'clean_cache.py', 'storage.py'], [stage.name for stage in ingest]),
+        Stage('train', None, {}, [sys.executable, 'partyembed/src/partyembeddings_house.py'],
+              [CORPUS], [MODEL], ['partyembed/src/partyembeddings_house.py'], ['preprocess']),
+        Stage('speech_stats', 'speech_stats:make_speech_statistics', {'path': CORPUS, 'output': SPEECH_STATS}, None,
+              [CORPUS], [SPEECH_STATS], ['speech_stats.py', 'storage.py'], ['preprocess']),
+        Stage('embeddings', 'embeddings:principal_components', {'model_path': MODEL}, None,
+              [MODEL, f'{MODEL}.*.npy'], [], ['embeddings.py'], ['train']),
+        Stage('join', 'join_data:main', {'model_path': MODEL, 'speech_stats': SPEECH_STATS, 'output': JOINED}, None,
+              [MODEL, SPEECH_STATS, 'data/electionResults/*.csv', 'data/election_schemas.json', 'data/modified_goldstandard_canada.csv',
+               'data/mp_aliases.csv'],
+              [JOINED], ['join_data.py', 'elections.py', 'mp_matcher.py', 'embeddings.py', 'storage.py'], ['speech_stats', 'embeddings']),
+        Stage('plots', None, {}, ['jupyter', 'nbconvert', '--to', 'notebook', '--execute', 'plots.ipynb',
+                                  '--output-dir', os.path.dirname(PLOTS), '--output', os.path.basename(PLOTS)],
+              [JOINED], [PLOTS], ['plots.ipynb', 'plot_helpers.py'], ['join']),
+    ]
+
+def _expand(patterns):
+    return sorted({fp for pattern in patterns for fp in glob.glob(pattern)})
+
+def fingerprint(stage):
+    """ Hash of a stage's parameters, the size and modification time of its inputs, and the content of its code. """
+    digest = hashlib.sha256(json.dumps([stage.target, stage.kwargs, stage.command], sort_keys=True, default=str).encode('utf-8'))
+    for fp in _expand(stage.inputs):
+        info = os.stat(fp)
+        digest.update(f'{fp}:{info.st_size}:{info.st_mtime_ns}'.encode('utf-8'))
+    for fp in _expand(stage.code):
+        with open(fp, 'rb') as f:
+            digest.update(fp.encode('utf-8') + f.read())
+    return digest.hexdigest()
+
+def count_rows(path, header=True):
+    """ Number of rows of a tabular output, not counting a csv header line if header, or None for other files. """
+    fmt = table_format(path)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+    if fmt == 'arrow':
+        from pyarrow import feather
+        return feather.read_table(path, memory_map=True).num_rows
+    if path.endswith('.csv') or path.endswith('.tsv'):
+        with open(path, 'rb') as f:
+            lines = sum(block.count(b'\n') for block in iter(lambda: f.read(1 << 20), b''))
+        return max(0, lines - 1) if header else lines
+    return None
+
+def _run_stage(stage):
+    """ Run one stage in the current (fresh) process and return its wall time and peak resident memory in MB. """
+    start = time.perf_counter()
+    if stage.command:
+        subprocess.run(stage.command, check=True)
+    else:
+        module, function = stage.target.split(':')
+        getattr(importlib.import_module(module), function)(**stage.kwargs)
+    wall = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux; commands report through their children's usage
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return wall, peak/1024
+
+def run_isolated(stage):
+    """ Run a stage in its own spawned process, so its peak memory is measured on its own. """
+    with multiprocessing.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(_run_stage, (stage,))
+
+def _load_state(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def _record(metrics, stage, status, wall=None, peak=None, rows=None):
+    new = not os.path.exists(metrics)
+    with open(metrics, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new:
+            writer.writerow(METRICS_COLUMNS)
+        writer.writerow([time.strftime('%Y-%m-%dT%H:%M:%S'), stage, status,
+                         '' if wall is None else f'{wall:.3f}', '' if peak is None else f'{peak:.1f}', '' if rows is None else rows])
+    print(f'{stage}: {status}' + ('' if wall is None else f' in {wall:.1f}s, peak {peak:.0f} MB' + ('' if rows is None else f', {rows} rows')))
+
+def run(stages, targets=None, force=False, workers=2, state_file=STATE_FILE, metrics=METRICS_FILE, dry_run=False):
+    """ Run the stages needed for targets, skipping those whose inputs and code are unchanged since their last run.
+
+        Independent stages run concurrently, each in its own process. Every stage's outcome, wall time, peak RSS,
+        and output row count are appended to the metrics file.
+
+        Args: stages: list of Stage, e.g. default_stages()
+              targets: names of the stages to bring up to date, with everything they depend on; None for all
+              force: rerun stages even if they are up to date
+              workers: number of stages run at once
+              state_file: json file of the fingerprint of each stage's last successful run
+              metrics: csv file the metrics are appended to
+              dry_run: only report which stages would run
+        Returns: dict of stage name -> status ('ran', 'skipped', 'failed', or 'blocked')
+    """
+    byName = {stage.name: stage for stage in stages}
+    needed = set()
+    todo = list(targets or byName)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(byName[name].deps)
+
+    state = _load_state(state_file)
+    status = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while len(status) < len(needed):
+            for stage in stages:
+                if stage.name not in needed or stage.name in status or stage.name in [name for name, _ in running.values()]:
+                    continue
+                if any(status.get(dep) in ('failed', 'blocked') for dep in stage.deps if dep in needed):
+                    status[stage.name] = 'blocked'
+                    _record(metrics, stage.name, 'blocked')
+                    continue
+                if not all(dep in status for dep in stage.deps if dep in needed):
+                    continue
+
+                key = fingerprint(stage)
+                outputsExist = all(glob.glob(pattern) for pattern in stage.outputs)
+                if not force and state.get(stage.name) == key and outputsExist:
+                    status[stage.name] = 'skipped'
+                    _record(metrics, stage.name, 'skipped')
+                elif dry_run:
+                    status[stage.name] = 'would run'
+                    print(f'{stage.name}: would run')
+                else:
+                    running[pool.submit(run_isolated, stage)] = (stage.name, key)
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, key = running.pop(future)
+                try:
+                    wall, peak = future.result()
+                except Exception as e:
+                    status[name] = 'failed'
+                    _record(metrics, name, 'failed')
+                    print(f'{name}: {e!r}', file=sys.stderr)
+                    continue
+                status[name] = 'ran'
+                state[name] = key
+                with open(state_file, 'w') as f:
+                    json.dump(state, f, indent=1)
+                rows = sum(filter(None, (count_rows(fp, header=os.path.normpath(fp) not in map(os.path.normpath, HEADERLESS))
+                                         for fp in _expand(byName[name].outputs)))) or None
+                _record(metrics, name, 'ran', wall, peak, rows)
+    return status
+
+
+if __name__ == '__main__':
+    stages = default_stages()
+    parser = argparse.ArgumentParser(description='Run the pipeline from raw lipad files to the joined table, skipping up-to-date stages.')
+    parser.add_argument('targets', nargs='*', help='stages to bring up to date, with their dependencies; all by default')
+    parser.add_argument('--force', action='store_true', help='rerun stages even if their inputs and code are unchanged')
+    parser.add_argument('--workers', type=int, default=2, help='number of independent stages run at once')
+    parser.add_argument('--metrics', default=METRICS_FILE, help='csv file per-stage metrics are appended to')
+    parser.add_argument('--dry-run', action='store_true', help='only report which stages would run')
+    args = parser.parse_args()
+    unknown = set(args.targets) - {stage.name for stage in stages}
+    if unknown:
+        parser.error(f'unknown stages: {", ".join(sorted(unknown))}')
+
+    status = run(stages, args.targets or None, force=args.force, workers=args.workers, metrics=args.metrics, dry_run=args.dry_run)
+    sys.exit(1 if any(s in ('failed', 'blocked') for s in status.values()) else 0)
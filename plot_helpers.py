@@ -1,48 +1,180 @@
+import hashlib
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import r2_score
 
-def linearRegression(X, Y):
-    linear_regressor = LinearRegression()
-    linear_regressor.fit(X.values.reshape(-1,1), Y.values.reshape(-1,1))
-
-    Ypred = linear_regressor.predict(X.values.reshape(-1,1)) 
+# memoized results of fit_lines and bootstrap_fits, keyed by the content of the data and the parameters
+_FITS = {}
+
+def _long_form(df, x, y, by):
+    """ One row per (observation, independent variable), sorted by group, with the group keys, x, and y. """
+    xs = [x] if isinstance(x, str) else list(x)
+    parts = [pd.DataFrame({**{k: df[k].values for k in by}, 'variable': v, 'x': df[v].values, 'y': df[y].values}) for v in xs]
+    keys = list(by) + ['variable']
+    return pd.concat(parts, ignore_index=True).sort_values(keys, kind='stable').reset_index(drop=True), keys
+
+def _memo_key(kind, df, x, y, by, *params):
+    xs = (x,) if isinstance(x, str) else tuple(x)
+    columns = list(dict.fromkeys(list(by) + list(xs) + [y]))
+    content = hashlib.sha256(pd.util.hash_pandas_object(df[columns], index=False).values.tobytes()).hexdigest()
+    return (kind, content, xs, y, tuple(by)) + params
+
+def _line_statistics(n, mx, my, Sxx, Sxy, Syy, xConstant, yConstant):
+    """ Slope, intercept, and r2 of least squares lines from group means and centered sums of squares and
+        products, matching LinearRegression and r2_score. """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(xConstant, 0.0, Sxy/np.where(xConstant, 1, Sxx))
+        intercept = my - slope*mx
+        # r2_score is 1 for a constant y predicted exactly, and undefined for fewer than two points
+        r2 = np.where(yConstant, 1.0, 1 - (Syy - slope*Sxy)/np.where(yConstant, 1, Syy))
+        r2 = np.where(n < 2, np.nan, r2)
+    return slope, intercept, r2
+
+def _check_missing(long, x, y):
+    if long[['x', 'y']].isna().values.any():
+        raise ValueError(f'missing values in {x} or {y}; drop them before fitting')
+
+def fit_lines(df, x, y, by=()):
+    """ Least squares line of y on each independent variable for every group of df, in closed form.
+
+        Sums of squares are taken around each group's means, so offsets large relative to the spread of the data
+        do not cost precision. Results are memoized, so plotting the same data again only draws.
+
+        Args: df: data, without missing values in x or y
+              x: independent variable column, or list of them
+              y: dependent variable column
+              by: columns whose values define the groups, e.g. ['parliamentNo', 'speakerparty']
+        Returns: df indexed by (*by, variable) with n, slope, intercept, and r2
+    """
+    key = _memo_key('fit', df, x, y, by)
+    if key not in _FITS:
+        long, keys = _long_form(df, x, y, by)
+        _check_missing(long, x, y)
+        grouped = long.groupby(keys, sort=True)
+        groups = grouped.ngroup().values
+        stats = grouped.agg(n=('x', 'size'), mx=('x', 'mean'), my=('y', 'mean'),
+                            x0=('x', 'min'), x1=('x', 'max'), y0=('y', 'min'), y1=('y', 'max'))
+        dx = long.x.values.astype(float) - stats.mx.values[groups]
+        dy = long.y.values.astype(float) - stats.my.values[groups]
+        sums = pd.DataFrame({'xx': dx*dx, 'xy': dx*dy, 'yy': dy*dy}).groupby(groups, sort=True).sum()
+        n = stats.n.values
+        slope, intercept, r2 = _line_statistics(n, stats.mx.values, stats.my.values, sums.xx.values, sums.xy.values,
+                                                sums.yy.values, (stats.x0 == stats.x1).values, (stats.y0 == stats.y1).values)
+        _FITS[key] = pd.DataFrame({'n': n, 'slope': slope, 'intercept': intercept, 'r2': r2}, index=stats.index)
+    return _FITS[key]
+
+def bootstrap_fits(df, x, y, by=(), n_boot=1000, alpha=0.05, batch=200, seed=0):
+    """ Bootstrap confidence intervals of the slope and r2 of fit_lines, resampling within each group.
+
+        All groups and variables are resampled together, batch replicates at a time, so memory stays at
+        batch x rows. Results are memoized.
+
+        Args: as for fit_lines, and
+              n_boot: number of bootstrap replicates
+              alpha: the interval covers 1 - alpha
+              batch: replicates drawn at once
+              seed: seed of the random generator
+        Returns: df indexed by (*by, variable) with slope_low, slope_high, r2_low, and r2_high
+    """
+    key = _memo_key('bootstrap', df, x, y, by, n_boot, alpha, seed)
+    if key not in _FITS:
+        long, keys = _long_form(df, x, y, by)
+        _check_missing(long, x, y)
+        groups = long.groupby(keys, sort=True).ngroup().values
+        sizes = np.bincount(groups)
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        rowStarts, rowSizes = starts[groups], sizes[groups]
+        xv, yv = long.x.values.astype(float), long.y.values.astype(float)
+
+        rng = np.random.default_rng(seed)
+        slopes, r2s = [], []
+        for done in range(0, n_boot, batch):
+            # each row is replaced by a random row of its own group
+            rows = rowStarts + (rng.random((min(batch, n_boot - done), len(long)))*rowSizes).astype(int)
+            bx, bi = xv[rows], yv[rows]
+            mx, my = np.add.reduceat(bx, starts, axis=1)/sizes, np.add.reduceat(bi, starts, axis=1)/sizes
+            dx, dy = bx - mx[:, groups], bi - my[:, groups]
+            sums = [np.add.reduceat(values, starts, axis=1) for values in (dx*dx, dx*dy, dy*dy)]
+            constant = [np.maximum.reduceat(values, starts, axis=1) == np.minimum.reduceat(values, starts, axis=1) for values in (bx, bi)]
+            slope, _, r2 = _line_statistics(sizes, mx, my, *sums, *constant)
+            slopes.append(slope)
+            r2s.append(r2)
+        slopes, r2s = np.concatenate(slopes), np.concatenate(r2s)
+
+        index = long.groupby(keys, sort=True).size().index
+        _FITS[key] = pd.DataFrame({'slope_low': np.quantile(slopes, alpha/2, axis=0), 'slope_high': np.quantile(slopes, 1 - alpha/2, axis=0),
+                                   'r2_low': np.nanquantile(r2s, alpha/2, axis=0), 'r2_high': np.nanquantile(r2s, 1 - alpha/2, axis=0)},
+                                  index=index)
+    return _FITS[key]
 
-    Ypred = Ypred.reshape(-1,)
+def linearRegression(X, Y):
+    fit = fit_lines(pd.DataFrame({'X': np.asarray(X), 'Y': np.asarray(Y)}), 'X', 'Y').iloc[0]
     X = np.array(X).reshape(-1,)
-    r2 = r2_score(Y.values.reshape(-1,1), Ypred)
-    
-    return X, Ypred, r2, linear_regressor.coef_
+    Ypred = fit.intercept + fit.slope*X
 
+    # the slope is returned as LinearRegression's (1, 1) coef_ array
+    return X, Ypred, fit.r2, np.array([[fit.slope]])
 
-def plot_with_lin_reg(axs, partydf, ax, clor, partyname, indVar, depVar='govtSupport', axesTicks=None):
+
+def plot_with_lin_reg(axs, partydf, ax, clor, partyname, indVar, depVar='govtSupport', axesTicks=None, fits=None, key=None):
+    """ Scatter depVar against indVar with its least squares line; fits is a table of fit_lines (and optionally
+        bootstrap_fits) holding this data's row at key, fitted here if not given or left out of the table. """
 
     axs[ax[0],ax[1]].scatter(partydf[indVar], partydf[depVar], color=clor)
 
-    X, Ypred, r2, coeff = linearRegression(partydf[indVar], partydf[depVar])
+    # looked up after the scatter is drawn, so data with missing values is still drawn before fitting it raises
+    if fits is not None and key in fits.index:
+        fit = fits.loc[key]
+    else:
+        fit = fit_lines(partydf, indVar, depVar).loc[indVar]
+    X = np.asarray(partydf[indVar], dtype=float)
 
-    axs[ax[0],ax[1]].plot(X, Ypred, color='#000000')
+    axs[ax[0],ax[1]].plot(X, fit.intercept + fit.slope*X, color='#000000')
 
-    axs[ax[0],ax[1]].set_title(partyname+'\n(a1=%.2f; r2=%.2f)' % (coeff, r2), size=11)
+    if 'slope_low' in fit:
+        axs[ax[0],ax[1]].set_title(partyname+'\n(a1=%.2f [%.2f, %.2f]; r2=%.2f)' % (fit.slope, fit.slope_low, fit.slope_high, fit.r2), size=11)
+    else:
+        axs[ax[0],ax[1]].set_title(partyname+'\n(a1=%.2f; r2=%.2f)' % (fit.slope, fit.r2), size=11)
 
     if not axesTicks:
         axs[ax[0],ax[1]].axes.xaxis.set_visible(False)
         axs[ax[0],ax[1]].axes.yaxis.set_visible(False)
 
 
-def plot_over_parliament(parlList, X, Y, labels, colorDict, title=None, xlabel=None, ylabel=None):
+def _fits_for_frames(frames, y, bootstrap=0):
+    """ fit_lines (with bootstrap_fits intervals if bootstrap replicates are asked for) of every frame at once.
+
+        Args: frames: dict of group key (a tuple of positions) -> (df, independent variable column to fit)
+        Returns: df indexed by (*group key, variable); frames with missing values are left out, and
+                 plot_with_lin_reg fits them itself, raising ValueError as LinearRegression did
+    """
+    parts = [df[[x, y]].rename(columns={x: '_x'}).assign(_variable=x, **{f'group{k}': g for k, g in enumerate(key)})
+             for key, (df, x) in frames.items() if not df[[x, y]].isna().values.any()]
+    if not parts:
+        return pd.DataFrame(columns=['n', 'slope', 'intercept', 'r2'])
+    groupColumns = [f'group{k}' for k in range(len(next(iter(frames))))] + ['_variable']
+    stacked = pd.concat(parts, ignore_index=True)
+    fits = fit_lines(stacked, '_x', y, by=groupColumns)
+    if bootstrap:
+        fits = fits.join(bootstrap_fits(stacked, '_x', y, by=groupColumns, n_boot=bootstrap))
+    return fits.droplevel(-1)
+
+
+def plot_over_parliament(parlList, X, Y, labels, colorDict, title=None, xlabel=None, ylabel=None, bootstrap=0):
     axes = [[0,0], [0,1], [1,0], [1,1], [2,0]]
     fig, axs = plt.subplots(3,2, figsize=(10,10))
 
+    # every line is fitted in one pass; bootstrap > 0 adds confidence intervals of the slope to the titles
+    indVars = [x+'_share' for x in X] if type(X)==list else [X]*len(parlList)
+    fits = _fits_for_frames({(i,): (parl, indVars[i]) for i, parl in enumerate(parlList)}, Y, bootstrap)
+
     for i, parl in enumerate(parlList):
         if type(X)==list:
             indVar = X[i]+'_share'
         else:
             indVar = X
         colorMap = parl[labels].map(colorDict) 
-        plot_with_lin_reg(axs, parl, axes[i], colorMap, str(38+i)+' Parliament', indVar, depVar=Y)
+        plot_with_lin_reg(axs, parl, axes[i], colorMap, str(38+i)+' Parliament', indVar, depVar=Y, fits=fits, key=(i, indVar))
 
 
     fig.delaxes(axs[2,1])
@@ -55,11 +187,15 @@ def plot_over_parliament(parlList, X, Y, labels, colorDict, title=None, xlabel=N
     plt.legend(markers, list(colorDict.keys())[0:len(colorDict.keys())-1], numpoints=1, bbox_to_anchor=(1.25, 1))
 
 
-def plot_over_parl_party(byPartyParliament, X, title=None, xlabel=None, ylabel=None, depVar='govtSupport'):
+def plot_over_parl_party(byPartyParliament, X, title=None, xlabel=None, ylabel=None, depVar='govtSupport', bootstrap=0):
     partyaxesList = [[[rowi, columni] for rowi in range(0,6,1)] for columni in range(0,6,1)]
     partycolors = ['#f37021', '#3d9b35', '#33b2cc', '#d71920', '#1a4782']
     fig, axs = plt.subplots(5,5, figsize=(10,10))
 
+    indVars = [x+'_share' for x in X] if type(X)==list else [X]*len(byPartyParliament)
+    frames = {(i, j): (df, indVars[i]) for i, row in enumerate(byPartyParliament) for j, df in enumerate(row) if len(df)}
+    fits = _fits_for_frames(frames, depVar, bootstrap)
+
     for i in range(5):
         if type(X)==list:
             indVar = X[i]+'_share'
@@ -67,7 +203,7 @@ def plot_over_parl_party(byPartyParliament, X, title=None, xlabel=None, ylabel=N
             indVar = X
         for j in range(5):
             try:
-                plot_with_lin_reg(axs, byPartyParliament[i][j], partyaxesList[i][j], partycolors[j], '', indVar, axesTicks=False, depVar=depVar)
+                plot_with_lin_reg(axs, byPartyParliament[i][j], partyaxesList[i][j], partycolors[j], '', indVar, axesTicks=False, depVar=depVar, fits=fits, key=(i, j, indVar))
             except:
                 axs[partyaxesList[i][j][0],partyaxesList[i][j][1]].axes.xaxis.set_visible(False)
                 axs[partyaxesList[i][j][0],partyaxesList[i][j][1]].axes.yaxis.set_visible(False)
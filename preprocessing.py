@@ -1,4 +1,10 @@
+import argparse
 import glob
+import hashlib
+import itertools
+import json
+import os
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import re
@@ -12,35 +18,54 @@ from collections import Counter
 from nltk.tokenize import ToktokTokenizer
 from nltk.stem.snowball import SnowballStemmer
 from functools import reduce
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from clean_cache import CleanCache
+from storage import CORPUS_SCHEMA, CORPUS_CSV_WRITE, SPEECH_SCHEMA, TableWriter, iter_table, read_table, write_table
+import profiling
+from profiling import instrument
 
-def remove_unecessary_speakers(parlNo):
+# procedural speakers not otherwise filtered
+PARLIAMENTARIANS = ['The Speaker', 'The Deputy Speaker', 'The Chair', 'The Assistant Deputy Speaker', 'The Deputy Chair', 'The Assistant Deputy Chair', 'The Acting Speaker']
+PARLIAMENTARIAN_PATTERN = re.compile('|'.join(re.escape(person) for person in PARLIAMENTARIANS))
+
+# columns of the raw lipad files kept for preprocessing, all read as strings
+RAW_COLUMNS = ['basepk', 'speechdate', 'speechtext', 'pid', 'speakeroldname', 'speakername', 'speakerriding', 'speakerparty', 'maintopic']
+
+@instrument(items='result')
+def read_speakers(fp):
+    """ Read one raw lipad file and keep only speeches by identified, non-procedural speakers under a main topic. """
+    df = pd.read_csv(fp, usecols=lambda c: c in RAW_COLUMNS, dtype=str)
+
+    # Remove interjections or any time that speakers are not identified,
+    # and speeches when a main topic is not identified
+    df = df[df.speakeroldname.notnull() & df.maintopic.notnull()]
+
+    # remove procedural speakers not otherwise filtered
+    return df[~df.speakeroldname.str.contains(PARLIAMENTARIAN_PATTERN)]
+
+@instrument
+def remove_unecessary_speakers(parlNo, workers=8, output_format='csv', root='.', output_dir='.'):
     """ Remove speeches without an associated name and those made by procedural speakers.
+
+        Files are read and filtered concurrently, keeping only the RAW_COLUMNS, before being joined.
     
-        Args: parliament number {38, 39, 40, 41, 42}
-        Returns: None; saves output to csv 
+        Args: parlNo: parliament number {38, 39, 40, 41, 42}
+              workers: number of threads reading files
+              output_format: file extension of the output, 'csv' or a columnar format such as 'parquet'
+              root: directory holding the raw {parlNo}Parliament folders
+              output_dir: directory of the output
+        Returns: None; saves output to {output_dir}/{parlNo}Parl.{output_format}
     """
     # Load data
-    files = glob.glob(f'{str(parlNo)}Parliament/**/**/*.csv')
-    dfs = [pd.read_csv(fp) for fp in files]
+    files = glob.glob(f'{root}/{str(parlNo)}Parliament/**/**/*.csv')
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        dfs = list(pool.map(read_speakers, files))
     df = pd.concat(dfs, ignore_index=True)
-
-    # Remove interjections or any time that speakers are not identified
-    fillerProcedure = df.speakeroldname.isnull()
-    df = df.loc[~fillerProcedure]
-
-    # remove speeches when a main topic is not identified
-    fillerProcedure = df.maintopic.isnull()
-    df = df[~fillerProcedure]
-
-    # remove procedural speakers not otherwise filtered
-    parliamentarians = ['The Speaker', 'The Deputy Speaker', 'The Chair', 'The Assistant Deputy Speaker', 'The Deputy Chair', 'The Assistant Deputy Chair', 'The Acting Speaker']
-    for person in parliamentarians:
-        df = df[~df['speakeroldname'].str.contains(person)]
         
     # reset indices so that they start from 0 and go up by 1
     df = df.reset_index(drop=True)
-        
-    df.to_csv(f'{str(parlNo)}Parl.csv')
+
+    write_table(df, f'{output_dir}/{str(parlNo)}Parl.{output_format}', schema=SPEECH_SCHEMA)
 
 def strip_accents(text):
     text = unicodedata.normalize('NFD', text)
@@ -48,66 +73,275 @@ def strip_accents(text):
     text = text.decode("utf-8")
     return str(text)
 
+STOPWORDS = ['member','members','government','governments','opposition','opposite','leader',
+    'hon','exminister','prime','minister','ministers','parliament','house',
+    'ask','asked','asks','question','questioned','questions','bills','bill',
+    'party','parties','mp','mps','sir','madam','mr','gentleman','gentlemen','lady','ladies',
+    'speaker','chair','motion','motions','vote','votes','order','yes','deputy','secretary',
+    'canada','canadian','canadians',
+    'pursuant','supply','supplementary','please','friend','s',
+    'clause','amendment','i','ii','iii','section','sections', 'colleague', 'colleagues'] + list(xtext.ENGLISH_STOP_WORDS)
+
+# For replacement of contractions.
+CONTRACTIONS = {"you'd": 'you would', "he'd": 'he would', "she's": 'she is', "where'd": 'where did', "might've": 'might have', "he'll": 'he will', "they'll": 'they will',  "mightn't": 'might not', "you'd've": 'you would have', "shan't": 'shall not', "it'll": 'it will', "mayn't": 'may not', "couldn't": 'could not', "they'd": 'they would', "so've": 'so have', "needn't've": 'need not have', "they'll've": 'they will have', "it's": 'it is', "haven't": 'have not', "didn't": 'did not', "y'all'd": 'you all would', "needn't": 'need not', "who'll": 'who will', "wouldn't've": 'would not have', "when's": 'when is', "will've": 'will have', "it'd've": 'it would have', "what'll": 'what will', "that'd've": 'that would have', "y'all're": 'you all are', "let's": 'let us', "where've": 'where have', "o'clock": 'oclock', "when've": 'when have', "what're": 'what are', "should've": 'should have', "you've": 'you have', "they're": 'they are', "aren't": 'are not', "they've": 'they have', "it'd": 'it would', "i'll've": 'i will have', "they'd've": 'they would have', "you'll've": 'you will have', "wouldn't": 'would not', "we'd": 'we would', "hadn't've": 'had not have', "weren't": 'were not', "i'd": 'i would', "must've": 'must have', "what's": 'what is', "mustn't've": 'must not have', "what'll've": 'what will have', "ain't": 'aint', "doesn't": 'does not', "we'll": 'we will', "i'd've": 'i would have', "we've": 'we have', "oughtn't": 'ought not', "you're": 'you are', "who'll've": 'who will have', "shouldn't": 'should not', "can't've": 'cannot have', "i've": 'i have', "couldn't've": 'could not have', "why've": 'why have', "what've": 'what have', "can't": 'cannot', "don't": 'do not', "that'd": 'that would', "who's": 'who is', "would've": 'would have', "there'd": 'there would', "shouldn't've": 'should not have', "y'all": 'you all', "mustn't": 'must not', "she'll": 'she will', "hadn't": 'had not', "won't've": 'will not have', "why's": 'why is', "'cause": 'because', "wasn't": 'was not', "shan't've": 'shall not have', "ma'am": 'madam', "hasn't": 'has not', "to've": 'to have', "how'll": 'how will', "oughtn't've": 'ought not have', "he'll've": 'he will have', "we'd've": 'we would have', "won't": 'will not', "could've": 'could have', "isn't": 'is not', "she'll've": 'she will have', "we'll've": 'we will have', "you'll": 'you will', "who've": 'who have', "there's": 'there is', "y'all've": 'you all have', "we're": 'we are', "i'll": 'i will', "i'm": 'i am', "how's": 'how is', "she'd've": 'she would have', "sha'n't": 'shall not', "there'd've": 'there would have', "he's": 'he is', "it'll've": 'it will have', "that's": 'that is', "y'all'd've": 'you all would have', "he'd've": 'he would have', "how'd": 'how did', "where's": 'where is', "so's": 'so as', "she'd": 'she would', "mightn't've": 'might not have'}
+
+# bump whenever TextCleaner changes its output for the same configuration, to invalidate cached speeches
+CLEANER_VERSION = 1
+
+# 'fast' splits on whitespace, which gives the same tokens as Toktok once punctuation and accents are stripped;
+# 'toktok' runs nltk's ToktokTokenizer as the original cleaning did
+TOKENIZERS = ['fast', 'toktok']
+
+# canonical decomposition leaves ascii punctuation for a few characters once accents are stripped: U+037E becomes
+# ';' and U+1FEF becomes '`', which Toktok splits off as tokens too short to keep (it leaves the '=', '<', and '>'
+# of U+2260, U+226E, and U+226F inside their tokens)
+DECOMPOSED_PUNCTUATION = str.maketrans(';`', '  ')
+
 def clean_text(text):
-    tk = ToktokTokenizer()
-    stopwords = ['member','members','government','governments','opposition','opposite','leader',
-        'hon','exminister','prime','minister','ministers','parliament','house',
-        'ask','asked','asks','question','questioned','questions','bills','bill',
-        'party','parties','mp','mps','sir','madam','mr','gentleman','gentlemen','lady','ladies',
-        'speaker','chair','motion','motions','vote','votes','order','yes','deputy','secretary',
-        'canada','canadian','canadians',
-        'pursuant','supply','supplementary','please','friend','s',
-        'clause','amendment','i','ii','iii','section','sections', 'colleague', 'colleagues'] + list(xtext.ENGLISH_STOP_WORDS)
-
-    # For replacement of contractions.
-    contractions = {"you'd": 'you would', "he'd": 'he would', "she's": 'she is', "where'd": 'where did', "might've": 'might have', "he'll": 'he will', "they'll": 'they will',  "mightn't": 'might not', "you'd've": 'you would have', "shan't": 'shall not', "it'll": 'it will', "mayn't": 'may not', "couldn't": 'could not', "they'd": 'they would', "so've": 'so have', "needn't've": 'need not have', "they'll've": 'they will have', "it's": 'it is', "haven't": 'have not', "didn't": 'did not', "y'all'd": 'you all would', "needn't": 'need not', "who'll": 'who will', "wouldn't've": 'would not have', "when's": 'when is', "will've": 'will have', "it'd've": 'it would have', "what'll": 'what will', "that'd've": 'that would have', "y'all're": 'you all are', "let's": 'let us', "where've": 'where have', "o'clock": 'oclock', "when've": 'when have', "what're": 'what are', "should've": 'should have', "you've": 'you have', "they're": 'they are', "aren't": 'are not', "they've": 'they have', "it'd": 'it would', "i'll've": 'i will have', "they'd've": 'they would have', "you'll've": 'you will have', "wouldn't": 'would not', "we'd": 'we would', "hadn't've": 'had not have', "weren't": 'were not', "i'd": 'i would', "must've": 'must have', "what's": 'what is', "mustn't've": 'must not have', "what'll've": 'what will have', "ain't": 'aint', "doesn't": 'does not', "we'll": 'we will', "i'd've": 'i would have', "we've": 'we have', "oughtn't": 'ought not', "you're": 'you are', "who'll've": 'who will have', "shouldn't": 'should not', "can't've": 'cannot have', "i've": 'i have', "couldn't've": 'could not have', "why've": 'why have', "what've": 'what have', "can't": 'cannot', "don't": 'do not', "that'd": 'that would', "who's": 'who is', "would've": 'would have', "there'd": 'there would', "shouldn't've": 'should not have', "y'all": 'you all', "mustn't": 'must not', "she'll": 'she will', "hadn't": 'had not', "won't've": 'will not have', "why's": 'why is', "'cause": 'because', "wasn't": 'was not', "shan't've": 'shall not have', "ma'am": 'madam', "hasn't": 'has not', "to've": 'to have', "how'll": 'how will', "oughtn't've": 'ought not have', "he'll've": 'he will have', "we'd've": 'we would have', "won't": 'will not', "could've": 'could have', "isn't": 'is not', "she'll've": 'she will have', "we'll've": 'we will have', "you'll": 'you will', "who've": 'who have', "there's": 'there is', "y'all've": 'you all have', "we're": 'we are', "i'll": 'i will', "i'm": 'i am', "how's": 'how is', "she'd've": 'she would have', "sha'n't": 'shall not', "there'd've": 'there would have', "he's": 'he is', "it'll've": 'it will have', "that's": 'that is', "y'all'd've": 'you all would have', "he'd've": 'he would have', "how'd": 'how did', "where's": 'where is', "so's": 'so as', "she'd": 'she would', "mightn't've": 'might not have'}
-
-    # replace contractions
-    text = reduce(lambda a, kv: a.replace(*kv), contractions.items(), text.lower())
-    
-    # replace tab, newline, and carriage return characters with spaces
-    text = text.replace('\t',' ').replace('\n',' ').replace('\r',' ')
-    
-    # replace punctuation with spaces
-    text = text.translate(str.maketrans(string.punctuation, ' '*len(string.punctuation)))
-    
-    # remove accent characters
-    text = strip_accents(text)
-    
-    # tokenize for stopword removal
-    tokens = tk.tokenize(text)
-    
-    # remove stopwords
-    tokens = [w for w in tokens if w not in stopwords and len(w)>2 and w!=' ' and not w.isdigit()]
-    
-    # stemming using Snowball
-    tokens = [SnowballStemmer('english').stem(w) for w in tokens]
-    
-    # return string of tokens in order 
-    return ' '.join(tokens)
+    """ Clean a single speech with the shared default TextCleaner. """
+    return _default_cleaner().clean(text)
 
-def main():
-    # load data from the Parliaments of interest (2004 to 2019)
-    # note that the data already excludes speeches from the Speaker, etc., 
-    # those without speakers, and those without a main topic
-    root = './data/parliament_speeches'
-    files = ['/42Parl.csv', '/41Parl.csv', '/40Parl.csv', '/39Parl.csv', '/38Parl.csv']
-    dfs = [pd.read_csv(root+fp, low_memory=False) for fp in files]
+class TextCleaner:
+    """ Reusable speech cleaner that builds the tokenizer, stopword set, contraction pattern and stemmer once.
 
-    # remove speeches shorter than or equal to 30 words
-    byParl = [df[df['speechtext'].str.count('\s+')>30] for df in dfs]
+        Output of clean() is identical to applying the contraction table as successive str.replace passes,
+        replacing tabs, newlines and punctuation with spaces, stripping accents, tokenizing with Toktok,
+        dropping stopwords, short tokens and digits, and stemming with Snowball.
 
-    # reset indices 
-    # df = df.reset_index(drop=True)
+        Each distinct token is stemmed once; the stems can be saved and loaded between runs with save_stems
+        and load_stems.
 
-    # save the lengths of each of the Parliaments' for use in the final dataframe construction
-    lengths = [len(df) for df in byParl]
+        Args: stopwords: iterable of tokens to drop after tokenizing
+              contractions: dict of contraction -> expansion, applied in insertion order
+              language: language passed to the Snowball stemmer
+              tokenizer: one of TOKENIZERS; both give the same output of clean()
+    """
+    def __init__(self, stopwords=STOPWORDS, contractions=CONTRACTIONS, language='english', tokenizer='fast'):
+        if tokenizer not in TOKENIZERS:
+            raise ValueError(f'unknown tokenizer {tokenizer}, expected one of {TOKENIZERS}')
+        self.stopwords = frozenset(stopwords)
+        self.contractions = dict(contractions)
+        self.language = language
+        self.backend = tokenizer
+        self.tokenizer = ToktokTokenizer()
+        self.stemmer = SnowballStemmer(language)
 
-    # join the dataframes for ease of cleaning
-    df = pd.concat(byParl, ignore_index=True)
+        # every contraction is made of lowercase letters and apostrophes, so successive replace passes never
+        # reach outside a run of those characters; expand whole runs that contain an apostrophe at once
+        alphabet = ''.join(sorted(set(''.join(self.contractions)))).replace('-', '\\-').replace(']', '\\]')
+        self._contraction_pattern = re.compile(f"(?<![{alphabet}])[{alphabet}]*'[{alphabet}]*")
+        self._contraction_cache = {}
+
+        # tab, newline, carriage return, and punctuation all become spaces
+        self._space_table = str.maketrans('\t\n\r' + string.punctuation, ' '*(3+len(string.punctuation)))
+        self._stem_cache = {}
+
+    def fingerprint(self):
+        """ Hash of the cleaning configuration; changes whenever the output of clean() could change. """
+        config = json.dumps([CLEANER_VERSION, sorted(self.stopwords), list(self.contractions.items()),
+            self.language, nltk.__version__])
+        return hashlib.sha256(config.encode('utf-8')).hexdigest()[:16]
+
+    def _expand_run(self, match):
+        run = match.group()
+        expanded = self._contraction_cache.get(run)
+        if expanded is None:
+            expanded = reduce(lambda a, kv: a.replace(*kv), self.contractions.items(), run)
+            self._contraction_cache[run] = expanded
+        return expanded
+
+    def stem(self, word):
+        """ Stem a single token, memoizing the result since the vocabulary is small relative to the corpus. """
+        stemmed = self._stem_cache.get(word)
+        if stemmed is None:
+            stemmed = self.stemmer.stem(word)
+            self._stem_cache[word] = stemmed
+        return stemmed
+
+    def stem_count(self):
+        """ Number of memoized stems. """
+        return len(self._stem_cache)
+
+    def stems_since(self, count):
+        """ Stems memoized after the first count, as a dict of token -> stem. """
+        return dict(itertools.islice(self._stem_cache.items(), count, None))
+
+    def add_stems(self, stems):
+        """ Add a dict of token -> stem to the memoized stems, e.g. stems learned by a worker process. """
+        self._stem_cache.update(stems)
+
+    def save_stems(self, path):
+        """ Write the memoized stems to a json file, tagged with the stemmer that made them. """
+        with open(path, 'w') as f:
+            json.dump({'language': self.language, 'nltk': nltk.__version__, 'stems': self._stem_cache}, f)
+
+    def load_stems(self, path):
+        """ Add the stems saved by a previous run, unless the file is missing or was made by another stemmer.
+
+            Returns: number of stems loaded
+        """
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            saved = json.load(f)
+        if saved.get('language') != self.language or saved.get('nltk') != nltk.__version__:
+            return 0
+        self.add_stems(saved['stems'])
+        return len(saved['stems'])
+
+    def split(self, text):
+        """ Normalize a speech and split it into raw tokens, before stopwords are dropped and tokens stemmed. """
+        # replace contractions
+        text = text.lower()
+        if "'" in text:
+            text = self._contraction_pattern.sub(self._expand_run, text)
+
+        # replace tab, newline, carriage return, and punctuation characters with spaces
+        text = text.translate(self._space_table)
+
+        if self.backend == 'toktok':
+            # remove accent characters, and tokenize
+            return self.tokenizer.tokenize(strip_accents(text))
+
+        # remove accent characters; the text is then ascii without punctuation, which Toktok only splits on whitespace
+        if not text.isascii():
+            text = strip_accents(text).translate(DECOMPOSED_PUNCTUATION)
+        return text.split()
+
+    def tokens(self, text):
+        """ Return the cleaned, stemmed tokens of a speech in order. """
+        # remove stopwords, and stem
+        stopwords = self.stopwords
+        stem = self.stem
+        return [stem(w) for w in self.split(text)
+                if w not in stopwords and len(w)>2 and w!=' ' and not w.isdigit()]
+
+    def clean(self, text):
+        """ Return string of cleaned tokens in order. """
+        return ' '.join(self.tokens(text))
 
-    data_clean = pd.DataFrame(df.speechtext.apply(lambda x: clean_text(x)))
+_DEFAULT_CLEANER = None
 
+def _default_cleaner():
+    global _DEFAULT_CLEANER
+    if _DEFAULT_CLEANER is None:
+        _DEFAULT_CLEANER = TextCleaner()
+    return _DEFAULT_CLEANER
+
+# cleaner held by each worker process of clean_texts
+_WORKER_CLEANER = None
+
+def _init_worker(cleaner, profile=False):
+    global _WORKER_CLEANER
+    _WORKER_CLEANER = cleaner
+    profiling.init_worker(profile)
+
+@instrument(items=1)
+def _clean_with(cleaner, texts):
+    """ Cleaned speeches of one chunk, and the stems the cleaner learned on it. """
+    count = cleaner.stem_count()
+    return [cleaner.clean(t) for t in texts], cleaner.stems_since(count)
+
+def _clean_chunk(texts):
+    # send back the stems learned on this chunk, so the parent's cleaner ends up with the whole vocabulary,
+    # and the worker's profiling statistics, so the parent reports them
+    cleaned, stems = _clean_with(_WORKER_CLEANER, texts)
+    return cleaned, stems, profiling.collect()
+
+def _merge_chunks(results, cleaner):
+    for cleaned, stems, stats in results:
+        cleaner.add_stems(stems)
+        profiling.merge(stats)
+        yield cleaned
+
+class Vocabulary:
+    """ Consecutive integer IDs for cleaned tokens, assigned in order of first appearance.
+
+        Token IDs take a fraction of the memory and disk space of the joined strings, and are what the
+        embedding corpus reader streams.
+    """
+    def __init__(self, tokens=()):
+        self.ids = {}
+        for token in tokens:
+            self.ids.setdefault(token, len(self.ids))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def encode(self, tokens):
+        """ IDs of a sequence of tokens as an int32 array, adding unseen tokens to the vocabulary. """
+        ids = self.ids
+        return np.array([ids.setdefault(t, len(ids)) for t in tokens], dtype=np.int32)
+
+    def tokens(self):
+        """ List of tokens indexed by ID. """
+        return list(self.ids)
+
+    def decode(self, ids):
+        """ Tokens of a sequence of IDs. """
+        tokens = self.tokens()
+        return [tokens[i] for i in ids]
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.tokens(), f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+@instrument(items='result')
+def clean_texts(texts, workers=1, chunksize=2000, cleaner=None, pool=None, vocabulary=None):
+    """ Clean a sequence of speeches, optionally fanning chunks of it out over a process pool.
+
+        Args: texts: iterable of raw speech strings
+              workers: number of processes; 1 cleans serially in this process
+              chunksize: number of speeches sent to a worker at a time
+              cleaner: TextCleaner to use; defaults to the shared default cleaner
+              pool: already running ProcessPoolExecutor whose workers were initialized with _init_worker,
+                    reused across calls instead of starting a new pool; it must have been given this cleaner
+              vocabulary: Vocabulary to encode the cleaned tokens with, instead of joining them into strings
+        Returns: list of cleaned strings, or of int32 token ID arrays if a vocabulary is given, in input order
+    """
+    cleaner = cleaner or _default_cleaner()
+    texts = list(texts)
+    chunks = [texts[i:i+chunksize] for i in range(0, len(texts), chunksize)]
+    if workers <= 1 or len(texts) <= chunksize:
+        cleaned = _gather((_clean_with(cleaner, chunk)[0] for chunk in chunks), len(texts))
+    elif pool is not None:
+        cleaned = _gather(_merge_chunks(pool.map(_clean_chunk, chunks), cleaner), len(texts))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cleaner, profiling.enabled())) as pool:
+            cleaned = _gather(_merge_chunks(pool.map(_clean_chunk, chunks), cleaner), len(texts))
+
+    if vocabulary is None:
+        return cleaned
+    return [vocabulary.encode(t.split()) for t in cleaned]
+
+def _gather(cleanedChunks, total):
+    """ Join cleaned chunks in order, logging progress after each one if profiling asks for it. """
+    return [t for chunk in profiling.progress(cleanedChunks, total, 'clean_texts') for t in chunk]
+
+# input file (without extension), Parliament number, and governing party for each Parliament of interest (2004 to 2019)
+PARLIAMENTS = pd.DataFrame({
+    'file': ['/42Parl', '/41Parl', '/40Parl', '/39Parl', '/38Parl'],
+    'Parliament': [42, 41, 40, 39, 38],
+    'majorityparty': ['Liberal', 'Conservative', 'Conservative', 'Conservative', 'Liberal']})
+
+# columns of the {parliament number}Parl.csv files used to build the partyembed input
+SPEECH_COLUMNS = ['basepk', 'speechtext', 'pid', 'speakername', 'speakerriding', 'speakerparty']
+
+@instrument(items=0)
+def format_for_partyembed(df, cleaned, parliament, majorityparty):
+    """ Arrange speeches and their cleaned text in the column order expected by partyembed.
+
+        Args: df: speeches with the SPEECH_COLUMNS columns
+              cleaned: cleaned speech text aligned with df
+              parliament: Parliament number, or a sequence of them aligned with df
+              majorityparty: governing party, or a sequence of them aligned with df
+        Returns: df of the ten partyembed columns
+    """
     # reformat for partyembed
     # 0: Congress
     # 1: Speech ID
@@ -119,23 +353,147 @@ def main():
     # 7: Party
     # 8: Majority Party (0/1)
     # 9: Presidential Party (0/1)
-
-    result = pd.DataFrame()
-    result['Parliament'] = [42]*lengths[0] + [41]*lengths[1] + [40]*lengths[2] + [39]*lengths[3] + [38]*lengths[4] 
+    result = pd.DataFrame(index=df.index)
+    result['Parliament'] = parliament
     result['speechID'] = df.basepk
-    result['speechtext'] = data_clean
+    result['speechtext'] = list(cleaned)
     result['speakerID'] = df.pid
     result['speakername'] = df.speakername
-    result['chamber'] = ['HoC']*len(df)
+    result['chamber'] = 'HoC'
     result['riding'] = df.speakerriding
     result['speakerparty'] = df.speakerparty
-    result['majorityparty'] = ['Liberal']*lengths[0] + ['Conservative']*lengths[1] + ['Conservative']*lengths[2] + ['Conservative']*lengths[3] + ['Liberal']*lengths[4] 
-    result['province'] = [0]*len(df)
+    result['majorityparty'] = majorityparty
+    result['province'] = 0
+    return result
+
+@instrument(items=0)
+def _clean_speeches(df, workers, cleaner, pool, cache):
+    """ Clean df.speechtext, going through the cache of previously cleaned speeches if one is given. """
+    clean_fn = lambda texts: clean_texts(texts, workers=workers, cleaner=cleaner, pool=pool)
+    if cache is None:
+        return clean_fn(df.speechtext)
+    return cache.clean(df.basepk, df.speechtext, clean_fn)
+
+@instrument
+def main(workers=1, stream=False, chunksize=50000, root='./data/parliament_speeches', output='38to42Parl.csv',
+         cache=None, cache_report=False, input_format='csv', stem_cache=None):
+    """ Clean the speeches of the 38th to 42nd Parliaments and format them for partyembed.
+
+        Args: workers: number of processes used to clean speeches
+              stream: read each Parliament in chunks of chunksize rows and append to the output as they are
+                      cleaned, so memory depends on chunksize rather than the size of the corpus
+              chunksize: rows per chunk when streaming
+              root: directory holding the {parliament number}Parl files
+              output: path of the partyembed input; tab-separated unless the extension names a columnar format
+                      such as .parquet
+              cache: path of a CleanCache file; only speeches that are new, edited, or cleaned under a different
+                     configuration are re-cleaned
+              cache_report: print cache hits and misses when done
+              input_format: extension of the {parliament number}Parl files, e.g. 'csv' or 'parquet'
+              stem_cache: json file of stems loaded before cleaning and saved after, so later runs only stem
+                          tokens they have not seen before
+        Returns: None; saves output to csv
+    """
+    cleaner = _default_cleaner()
+    if stem_cache:
+        cleaner.load_stems(stem_cache)
+    speechCache = CleanCache(cache, cleaner.fingerprint()) if cache else None
+    try:
+        if stream:
+            stream_for_partyembed(workers=workers, chunksize=chunksize, root=root, output=output, cache=speechCache,
+                input_format=input_format)
+        else:
+            _main_in_memory(workers, root, output, speechCache, input_format)
+        if stem_cache:
+            cleaner.save_stems(stem_cache)
+    finally:
+        if speechCache is not None:
+            if cache_report:
+                print(speechCache.report())
+            speechCache.close()
+
+@instrument
+def _main_in_memory(workers, root, output, cache, input_format):
+    """ Load every Parliament at once, then clean and save them together. """
+    # load data from the Parliaments of interest (2004 to 2019)
+    # note that the data already excludes speeches from the Speaker, etc., 
+    # those without speakers, and those without a main topic
+    dfs = [read_table(f'{root}{fp}.{input_format}', low_memory=False) for fp in PARLIAMENTS.file]
+
+    # remove speeches shorter than or equal to 30 words
+    byParl = [df[df['speechtext'].str.count('\s+')>30] for df in dfs]
+
+    # save the lengths of each of the Parliaments' for use in the final dataframe construction
+    lengths = [len(df) for df in byParl]
+
+    # join the dataframes for ease of cleaning
+    df = pd.concat(byParl, ignore_index=True)
+
+    data_clean = _clean_speeches(df, workers, _default_cleaner(), None, cache)
+
+    result = format_for_partyembed(df, data_clean, PARLIAMENTS.Parliament.repeat(lengths).values,
+        PARLIAMENTS.majorityparty.repeat(lengths).values)
+
+    write_table(result, output, schema=CORPUS_SCHEMA, **CORPUS_CSV_WRITE)
+
+@instrument
+def stream_for_partyembed(workers=1, chunksize=50000, root='./data/parliament_speeches', output='38to42Parl.csv',
+                          cache=None, input_format='csv'):
+    """ Streaming version of main: filter, clean, and append one chunk of one Parliament at a time.
+
+        Parliament and majority party labels come from the PARLIAMENTS table for the file being read.
+        Identifier columns are read as strings so that every chunk is written the same way.
+        If cache is a CleanCache, speeches already cleaned under the current configuration are read from it.
+
+        Returns: None; saves output to csv
+    """
+    cleaner = _default_cleaner()
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(cleaner, profiling.enabled()))
+
+    try:
+        with TableWriter(output, schema=CORPUS_SCHEMA, **CORPUS_CSV_WRITE) as writer:
+            for meta in PARLIAMENTS.itertuples():
+                reader = iter_table(f'{root}{meta.file}.{input_format}', chunksize, columns=SPEECH_COLUMNS,
+                    dtype={'basepk': str, 'pid': str})
+                for chunk in reader:
+                    # remove speeches shorter than or equal to 30 words
+                    chunk = chunk[chunk['speechtext'].str.count('\s+')>30]
+                    if len(chunk) == 0:
+                        continue
 
-    result.to_csv('38to42Parl.csv',sep='\t', index=False, line_terminator='\n', header=False)
+                    data_clean = _clean_speeches(chunk, workers, cleaner, pool, cache)
+                    result = format_for_partyembed(chunk, data_clean, meta.Parliament, meta.majorityparty)
+                    writer.write(result)
+    finally:
+        if pool is not None:
+            pool.shutdown()
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description='Clean lipad speeches and format them for partyembed.')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes used to clean speeches')
+    parser.add_argument('--stream', action='store_true', help='read, clean, and write each Parliament in chunks')
+    parser.add_argument('--chunksize', type=int, default=50000, help='rows per chunk when streaming')
+    parser.add_argument('--cache', help='path of a cache of cleaned speeches; only new or changed speeches are re-cleaned')
+    parser.add_argument('--cache-report', action='store_true', help='print cache hits and misses')
+    parser.add_argument('--stem-cache', help='json file of stems kept between runs')
+    parser.add_argument('--ingest', type=int, nargs='+', metavar='PARLIAMENT',
+        help='instead of cleaning, filter the raw lipad files of these Parliaments into {parliament number}Parl files')
+    parser.add_argument('--parquet', action='store_true',
+        help='write ingested Parliaments as parquet rather than csv, or read them as parquet when cleaning')
+    parser.add_argument('--output', default='38to42Parl.csv',
+        help='partyembed input; tab-separated unless the extension is a columnar format such as .parquet')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_arguments(args)
+    if args.ingest:
+        for parlNo in args.ingest:
+            remove_unecessary_speakers(parlNo, output_format='parquet' if args.parquet else 'csv')
+    else:
+        main(workers=args.workers, stream=args.stream, chunksize=args.chunksize, cache=args.cache,
+            cache_report=args.cache_report, input_format='parquet' if args.parquet else 'csv', output=args.output,
+            stem_cache=args.stem_cache)
 
 
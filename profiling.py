@@ -0,0 +1,214 @@
+""" Opt-in instrumentation of the pipeline's hot paths.
+
+    Enabled by setting PIPELINE_PROFILE to an output prefix (or with the --profile flag of preprocessing,
+    speech_stats, and join_data). While enabled, every function decorated with instrument records its calls,
+    cumulative time, items processed, and growth of peak resident memory, written to {prefix}.stats.csv when the
+    process exits. PIPELINE_PROFILE_MODE additionally writes a cProfile dump ({prefix}.prof, for pstats or
+    snakeviz) or a flamegraph-compatible collapsed-stack file sampled from the main thread ({prefix}.collapsed),
+    and PIPELINE_PROFILE_PROGRESS logs the progress and throughput of clean_texts after every chunk.
+    Worker processes of clean_texts record their statistics too and send them back with each chunk, to be
+    reported by the main process; only the main process is profiled or sampled.
+
+    When disabled, a decorated function costs one attribute check per call.
+"""
+import atexit
+import cProfile
+import csv
+import functools
+import multiprocessing
+import os
+import resource
+import signal
+import sys
+import time
+from collections import Counter
+
+ENV_VAR = 'PIPELINE_PROFILE'
+MODE_ENV_VAR = 'PIPELINE_PROFILE_MODE'
+PROGRESS_ENV_VAR = 'PIPELINE_PROFILE_PROGRESS'
+PROFILE_MODES = ['stats', 'cprofile', 'collapsed']
+STATS_COLUMNS = ['function', 'calls', 'seconds', 'items', 'items_per_second', 'peak_rss_growth_mb']
+SAMPLE_INTERVAL = 0.005
+
+class _State:
+    enabled = False
+    progress = False
+    prefix = None
+    mode = 'stats'
+    profiler = None
+    samples = None
+
+_STATE = _State()
+# function label -> [calls, seconds, items, peak RSS growth in MB]
+_STATS = {}
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024
+
+def _count(items, args, result):
+    if items == 'result':
+        return len(result)
+    if items is not None and len(args) > items:
+        return len(args[items])
+    return 0
+
+def instrument(fn=None, items=None):
+    """ Decorator recording calls, time, items, and memory of a function while instrumentation is enabled.
+
+        Args: items: what a call processes, counted with len(): 'result' for the returned value, or the index
+                     of a positional argument (0 is self for methods); None to count nothing
+    """
+    if fn is None:
+        return functools.partial(instrument, items=items)
+    label = f'{fn.__module__}.{fn.__qualname__}'
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _STATE.enabled:
+            return fn(*args, **kwargs)
+        peak = _peak_rss_mb()
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        stats = _STATS.setdefault(label, [0, 0.0, 0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] += _count(items, args, result)
+        stats[3] += _peak_rss_mb() - peak
+        return result
+    return wrapper
+
+def progress(chunks, total, label):
+    """ Pass through an iterable of processed chunks, logging items done and throughput to stderr after each.
+
+        Returns chunks untouched unless progress logging is enabled.
+    """
+    if not (_STATE.enabled and _STATE.progress):
+        return chunks
+    return _logged(chunks, total, label)
+
+def _logged(chunks, total, label):
+    done = 0
+    start = time.perf_counter()
+    for chunk in chunks:
+        done += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(f'{label}: {done}/{total} ({100*done/max(total, 1):.0f}%) in {elapsed:.1f}s, {done/max(elapsed, 1e-9):.0f}/s',
+              file=sys.stderr)
+        yield chunk
+
+def _sample(signum, frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    _STATE.samples[';'.join(reversed(stack))] += 1
+
+def enable(prefix, mode='stats', progress=False):
+    """ Start instrumenting this process; results are written under prefix when it exits, or by finish().
+
+        Args: prefix: path prefix of the output files, e.g. 'profiles/preprocess'
+              mode: 'stats' for the per-function table only, 'cprofile' to also dump a pstats file, or
+                    'collapsed' to also sample collapsed stacks for flamegraph.pl or speedscope
+              progress: log progress and throughput of clean_texts after every chunk
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f'unknown profile mode {mode}, expected one of {PROFILE_MODES}')
+    if _STATE.enabled:
+        return
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    _STATE.enabled, _STATE.prefix, _STATE.mode, _STATE.progress = True, prefix, mode, progress
+    _STATS.clear()
+    if mode == 'cprofile':
+        _STATE.profiler = cProfile.Profile()
+        _STATE.profiler.enable()
+    elif mode == 'collapsed':
+        _STATE.samples = Counter()
+        signal.signal(signal.SIGPROF, _sample)
+        signal.setitimer(signal.ITIMER_PROF, SAMPLE_INTERVAL, SAMPLE_INTERVAL)
+    atexit.register(finish)
+
+def enabled():
+    """ Whether this process is instrumented. """
+    return _STATE.enabled
+
+def init_worker(enabled):
+    """ Set up a worker process: record statistics for its parent to merge (see collect and merge) if enabled,
+        but drop any profiler inherited through fork and never write files. """
+    if _STATE.profiler is not None:
+        _STATE.profiler.disable()
+        _STATE.profiler = None
+    if _STATE.samples is not None:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_IGN)
+        _STATE.samples = None
+    _STATE.enabled, _STATE.progress, _STATE.prefix = enabled, False, None
+    _STATS.clear()
+
+def collect():
+    """ Take the statistics recorded in this process since the last call, e.g. to send them from a worker. """
+    stats = dict(_STATS)
+    _STATS.clear()
+    return stats
+
+def merge(stats):
+    """ Add statistics collected in another process to this one's. """
+    if not _STATE.enabled:
+        return
+    for label, values in stats.items():
+        totals = _STATS.setdefault(label, [0, 0.0, 0, 0.0])
+        for k, value in enumerate(values):
+            totals[k] += value
+
+def report():
+    """ Rows of the per-function statistics recorded so far, slowest first, with the STATS_COLUMNS fields. """
+    rows = [[label, calls, seconds, items, items/seconds if items and seconds else '', memory]
+            for label, (calls, seconds, items, memory) in _STATS.items()]
+    return sorted(rows, key=lambda row: -row[2])
+
+def finish():
+    """ Stop instrumenting and write {prefix}.stats.csv, plus {prefix}.prof or {prefix}.collapsed. """
+    if not _STATE.enabled or _STATE.prefix is None:
+        return
+    _STATE.enabled = False
+    prefix = _STATE.prefix
+    if _STATE.profiler is not None:
+        _STATE.profiler.disable()
+        _STATE.profiler.dump_stats(f'{prefix}.prof')
+        _STATE.profiler = None
+    if _STATE.samples is not None:
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_DFL)
+        with open(f'{prefix}.collapsed', 'w') as f:
+            for stack, count in _STATE.samples.most_common():
+                f.write(f'{stack} {count}\n')
+        _STATE.samples = None
+
+    rows = report()
+    with open(f'{prefix}.stats.csv', 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(STATS_COLUMNS)
+        writer.writerows(rows)
+    for label, calls, seconds, items, rate, memory in rows:
+        print(f'{label}: {calls} calls, {seconds:.2f}s' + (f', {items} items ({rate:.0f}/s)' if rate else '')
+              + f', peak +{memory:.0f} MB', file=sys.stderr)
+
+def add_arguments(parser):
+    """ Add the --profile, --profile-mode, and --profile-progress flags to an argparse parser. """
+    parser.add_argument('--profile', metavar='PREFIX', help=f'instrument the run and write profiles under PREFIX (or set {ENV_VAR})')
+    parser.add_argument('--profile-mode', choices=PROFILE_MODES, default='stats',
+                        help='also dump a cProfile file or sample collapsed stacks for a flamegraph')
+    parser.add_argument('--profile-progress', action='store_true', help='log progress and throughput of clean_texts')
+
+def enable_from_arguments(args):
+    """ Enable instrumentation if --profile was given. """
+    if args.profile:
+        enable(args.profile, args.profile_mode, args.profile_progress)
+
+
+if os.environ.get(ENV_VAR) and multiprocessing.current_process().name == 'MainProcess':
+    enable(os.environ[ENV_VAR], os.environ.get(MODE_ENV_VAR, 'stats'), bool(os.environ.get(PROGRESS_ENV_VAR)))
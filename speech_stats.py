@@ -1,27 +1,121 @@
+import argparse
 import pandas as pd
-from collections import Counter
+from storage import CORPUS_COLUMNS, CORPUS_CSV_READ, SPEECH_STATS_SCHEMA, iter_table, write_table
+import profiling
+from profiling import instrument
 
-def make_speech_statistics():
-    """ Genenerate speech """
-    columnNames= ['Parliament', 'speechID', 'speechtext', 'speakerID', 'speakername', 'chamber', 'riding', 'speakerparty', 'majorityparty', 'province']
-    result = pd.read_csv('./data/38to42Parl_forembeddings.csv', sep='\t', header=None, names=columnNames)
+COLUMN_NAMES = CORPUS_COLUMNS
 
+def _length_and_tokens(text):
+    """ Number of whitespace runs (as counted by str.count(r'\s+')) and of tokens in a speech, in one split. """
+    tokens = text.split()
+    if not tokens:
+        return (1 if text else 0), 0
+    return len(tokens) - 1 + text[0].isspace() + text[-1].isspace(), len(tokens)
+
+@instrument(items=0)
+def partial_statistics(chunk):
+    """ Histogram of speech lengths for each MP in one chunk of the embeddings corpus.
+
+        Args: df with the Parliament, speechtext, speakername, and speakerparty columns of the corpus
+        Returns: df with one row per (name_parl, speech_length, tokens) and the number of such speeches
+    """
     # name that matches output from embeddings: MP_party_parliamentNo
-    result['name_parl'] = result.apply(lambda row: row.speakername+'_'+row.speakerparty+'_'+str(row.Parliament), axis=1)
+    name_parl = chunk.speakername + '_' + chunk.speakerparty + '_' + chunk.Parliament.astype(str)
+    # groupby would silently drop these speeches from the counts
+    missing = name_parl.isna()
+    if missing.any():
+        raise ValueError(f'{missing.sum()} speeches without a speaker name or party, e.g. at rows {list(chunk.index[missing][:5])}')
+
+    # number of words (whitespace runs) and tokens in each speech; an empty speech is read back as a missing value
+    counts = [_length_and_tokens(text) for text in chunk.speechtext.fillna('')]
+    speech_length, tokens = zip(*counts) if counts else ((), ())
+
+    lengths = pd.DataFrame({'name_parl': name_parl.values, 'speech_length': speech_length, 'tokens': tokens})
+    return lengths.groupby(['name_parl', 'speech_length', 'tokens'], sort=False).size().rename('speeches').reset_index()
+
+@instrument
+def merge_partial_statistics(partials):
+    """ Combine the histograms of several chunks, keeping MPs in order of first appearance. """
+    merged = pd.concat(partials, ignore_index=True)
+    return merged.groupby(['name_parl', 'speech_length', 'tokens'], sort=False)['speeches'].sum().reset_index()
+
+def _median_length(histogram):
+    """ Median speech length of each MP, computed exactly from their histogram of speech lengths. """
+    histogram = histogram.groupby(['name_parl', 'speech_length'])['speeches'].sum().reset_index()
+    cumulative = histogram.groupby('name_parl')['speeches'].cumsum()
+    total = histogram.groupby('name_parl')['speeches'].transform('sum')
+    start = cumulative - histogram.speeches
+
+    # the two middle positions of each MP's sorted speeches, which coincide for an odd number of speeches
+    lower = (total - 1)//2
+    upper = total//2
+    lowerValue = histogram.speech_length[(start <= lower) & (lower < cumulative)]
+    upperValue = histogram.speech_length[(start <= upper) & (upper < cumulative)]
+    names = histogram.name_parl
+    return (pd.Series(lowerValue.values, index=names[lowerValue.index]) + pd.Series(upperValue.values, index=names[upperValue.index]))/2
+
+@instrument(items=0)
+def statistics_from_histogram(histogram):
+    """ Per-MP speech statistics from a merged histogram of speech lengths.
+
+        Returns: df indexed by name_parl with speechFrequency, totalSpeechLength, meanSpeechLength,
+                 medianSpeechLength, and totalTokens
+    """
+    weighted = histogram.assign(length=histogram.speech_length*histogram.speeches, tokens=histogram.tokens*histogram.speeches)
+    grouped = weighted.groupby('name_parl', sort=False)
+    speechStats = pd.DataFrame({'speechFrequency': grouped['speeches'].sum(), 'totalSpeechLength': grouped['length'].sum()})
+    speechStats['meanSpeechLength'] = speechStats.totalSpeechLength/speechStats.speechFrequency
+    speechStats['medianSpeechLength'] = _median_length(histogram).reindex(speechStats.index)
+    speechStats['totalTokens'] = grouped['tokens'].sum()
+    speechStats.index.name = 'name_parl'
+    return speechStats
+
+@instrument(items=0)
+def statistics_by_parliament(speechStats):
+    """ Speech frequency and volume of each MP broken down by Parliament, one column per Parliament. """
+    parts = speechStats.index.to_series().str.rsplit('_', n=2, expand=True)
+    byParliament = speechStats[['speechFrequency', 'totalSpeechLength']].assign(speakername=parts[0].values, Parliament=parts[2].values)
+    byParliament = byParliament.pivot_table(index='speakername', columns='Parliament', values=['speechFrequency', 'totalSpeechLength'], aggfunc='sum', fill_value=0)
+    byParliament.columns = [f'{stat}_{parl}' for stat, parl in byParliament.columns]
+    return byParliament
+
+@instrument(items='result')
+def make_speech_statistics(path='./data/38to42Parl_forembeddings.csv', chunksize=500000, output='speechStats.csv',
+                           detailed_output='speechStats_detailed.csv', parliament_output='speechStats_byParliament.csv'):
+    """ Generate speech frequency and total speech volume for each MP in each Parliament.
 
-    # add column for number of words in each speech
-    result['speech_length'] = result.speechtext.str.count('\s+')
+        The corpus is read in chunks of chunksize speeches, each reduced to a histogram of speech lengths per MP,
+        so memory stays flat however large the corpus is.
 
-    # for each MP, get the total number of speeches made and the total speech volume in number of words
-    speechStats = pd.DataFrame.from_dict(Counter(result.name_parl), orient='index', columns=['speechFrequency'])
-    speechStats['totalSpeechLength'] = [0]*len(speechStats)
-    for i in range(len(result)):
-        speechStats.loc[result.name_parl[i],'totalSpeechLength'] += result.speech_length[i]
+        Args: path: embeddings corpus written by preprocessing.main, tab-separated or columnar (e.g. .parquet)
+              chunksize: speeches read at a time
+              output: MP_party_parliamentNo, speech frequency, and total speech volume; without header if csv
+              detailed_output: csv adding mean and median speech length and token counts, with header; None to skip
+              parliament_output: csv of frequency and volume of each MP per Parliament, with header; None to skip
+        Returns: df of detailed statistics indexed by MP_party_parliamentNo
+    """
+    reader = iter_table(path, chunksize, columns=['Parliament', 'speechtext', 'speakername', 'speakerparty'],
+                        dtype={'speechtext': str, 'speakername': str, 'speakerparty': str}, **CORPUS_CSV_READ)
+    histogram = merge_partial_statistics([partial_statistics(chunk) for chunk in reader])
+    speechStats = statistics_from_histogram(histogram)
 
-    speechStats = speechStats.reset_index()
+    write_table(speechStats[['speechFrequency', 'totalSpeechLength']].reset_index(), output, schema=SPEECH_STATS_SCHEMA,
+                sep=',', index=False, line_terminator='\n', header=False)
+    if detailed_output:
+        write_table(speechStats.reset_index(), detailed_output, schema=SPEECH_STATS_SCHEMA, index=False, line_terminator='\n')
+    if parliament_output:
+        write_table(statistics_by_parliament(speechStats).reset_index(), parliament_output, index=False, line_terminator='\n')
 
-    speechStats.to_csv('speechStats.csv',sep=',', index=False, line_terminator='\n', header=False)
+    return speechStats
 
 
 if __name__ == '__main__':
-    make_speech_statistics()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Generate speech frequency and volume statistics for each MP.')
+    parser.add_argument('--chunksize', type=int, default=500000, help='speeches read at a time')
+    parser.add_argument('--corpus', default='./data/38to42Parl_forembeddings.csv', help='embeddings corpus, csv or parquet')
+    parser.add_argument('--output', default='speechStats.csv', help='speech statistics, csv or parquet')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.enable_from_arguments(args)
+    make_speech_statistics(args.corpus, chunksize=args.chunksize, output=args.output)
@@ -0,0 +1,147 @@
+import os
+import pandas as pd
+from profiling import instrument
+
+# typed columns of the tables handed between stages; columns not listed keep their inferred (usually string) type
+SPEECH_SCHEMA = {'speakerparty': 'category', 'speakerriding': 'category'}
+CORPUS_SCHEMA = {'Parliament': 'int64', 'chamber': 'category', 'riding': 'category', 'speakerparty': 'category',
+                 'majorityparty': 'category', 'province': 'int64'}
+SPEECH_STATS_SCHEMA = {'speechFrequency': 'int64', 'totalSpeechLength': 'int64'}
+JOINED_SCHEMA = {'speakerparty': 'category', 'parliamentNo': 'int64', 'riding': 'category', 'province': 'category'}
+
+# columns of the embeddings corpus, which is exported as a headerless tab-separated file for partyembed
+CORPUS_COLUMNS = ['Parliament', 'speechID', 'speechtext', 'speakerID', 'speakername', 'chamber', 'riding', 'speakerparty', 'majorityparty', 'province']
+CORPUS_CSV_READ = {'sep': '\t', 'header': None, 'names': CORPUS_COLUMNS}
+CORPUS_CSV_WRITE = {'sep': '\t', 'index': False, 'line_terminator': '\n', 'header': False}
+
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+ARROW_EXTENSIONS = ('.feather', '.arrow')
+
+def table_format(path):
+    """ Storage format of a path from its extension: 'parquet', 'arrow', or 'csv' for anything else. """
+    extension = os.path.splitext(str(path))[1].lower()
+    if extension in PARQUET_EXTENSIONS:
+        return 'parquet'
+    if extension in ARROW_EXTENSIONS:
+        return 'arrow'
+    return 'csv'
+
+def apply_schema(df, schema):
+    """ Cast the columns of df named in schema to their types. """
+    if not schema:
+        return df
+    types = {column: dtype for column, dtype in schema.items() if column in df.columns}
+    return df.astype(types) if types else df
+
+@instrument(items='result')
+def read_table(path, columns=None, schema=None, memory_map=True, **csv_options):
+    """ Read a stage's table from csv, parquet, or arrow, picked by the file extension.
+
+        Args: path: file to read
+              columns: columns to load; None for all. Columnar formats only read these from disk.
+              schema: column types applied after reading, e.g. CORPUS_SCHEMA
+              memory_map: memory-map parquet and arrow files rather than reading them into memory first
+              csv_options: passed to pd.read_csv for csv files only, e.g. sep, header, or names
+        Returns: df
+    """
+    fmt = table_format(path)
+    if fmt == 'parquet':
+        df = pd.read_parquet(path, columns=columns, memory_map=memory_map)
+    elif fmt == 'arrow':
+        from pyarrow import feather
+        df = feather.read_table(path, columns=columns, memory_map=memory_map).to_pandas()
+    else:
+        if columns is not None:
+            csv_options['usecols'] = columns
+        df = pd.read_csv(path, **csv_options)
+    return apply_schema(df, schema)
+
+def iter_table(path, chunksize, columns=None, schema=None, **csv_options):
+    """ Iterate over a stage's table in dfs of at most chunksize rows, without loading the whole file.
+
+        Args: as for read_table
+        Yields: df
+    """
+    fmt = table_format(path)
+    if fmt == 'csv':
+        if columns is not None:
+            csv_options['usecols'] = columns
+        for chunk in pd.read_csv(path, chunksize=chunksize, **csv_options):
+            yield apply_schema(chunk, schema)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunksize, columns=columns):
+            yield apply_schema(batch.to_pandas(), schema)
+    else:
+        from pyarrow import feather
+        for batch in feather.read_table(path, columns=columns, memory_map=True).to_batches(max_chunksize=chunksize):
+            yield apply_schema(batch.to_pandas(), schema)
+
+@instrument(items=0)
+def write_table(df, path, schema=None, **csv_options):
+    """ Write a stage's table to csv, parquet, or arrow, picked by the file extension.
+
+        Args: df: table to write
+              path: destination file
+              schema: column types applied before writing, kept by the columnar formats
+              csv_options: passed to df.to_csv for csv files only, e.g. sep, index, or header
+    """
+    df = apply_schema(df, schema)
+    fmt = table_format(path)
+    if fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    elif fmt == 'arrow':
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        df.to_csv(path, **csv_options)
+
+class TableWriter:
+    """ Append dfs with the same columns to one csv, parquet, or arrow file, e.g. one chunk at a time.
+
+        Args: as for write_table; the file is truncated when the writer is created
+    """
+    def __init__(self, path, schema=None, **csv_options):
+        self.path = path
+        self.schema = schema
+        self.csv_options = csv_options
+        self.format = table_format(path)
+        self._writer = None
+        self._schema = None
+        if self.format == 'csv':
+            open(path, 'w').close()
+
+    @instrument(items=1)
+    def write(self, df):
+        if self.format == 'csv':
+            apply_schema(df, self.schema).to_csv(self.path, mode='a', **self.csv_options)
+            return
+
+        # categories differ between chunks, so categorical columns are written as plain values and the
+        # schema restores them on reading
+        schema = {column: dtype for column, dtype in (self.schema or {}).items() if dtype != 'category'}
+        df = apply_schema(df, schema)
+        df = df.astype({column: object for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)})
+        import pyarrow as pa
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.format == 'parquet':
+                import pyarrow.parquet as pq
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.path, self._schema)
+        table = table.cast(self._schema)
+        if self.format == 'parquet':
+            self._writer.write_table(table)
+        else:
+            self._writer.write(table)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
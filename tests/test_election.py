@@ -0,0 +1,25 @@
+import pandas as pd
+import pytest
+
+from join_data import LABEL_MAP, generateElectionDataforRidings
+from benchmarks.election import reference_generateElectionDataforRidings
+from benchmarks.synthetic import make_election
+
+
+@pytest.mark.parametrize('parliament', sorted(LABEL_MAP))
+def test_matches_original_loop(parliament):
+    rawElection = make_election(200, LABEL_MAP[parliament], seed=parliament)
+    # the original builds its riding list from a set, so its row order is arbitrary
+    expected = reference_generateElectionDataforRidings(rawElection, parliament).sort_values('riding').reset_index(drop=True)
+    actual = generateElectionDataforRidings(rawElection, parliament)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_riding_without_winner():
+    rawElection = make_election(20, LABEL_MAP[42], seed=1)
+    majorityLabel = LABEL_MAP[42][3]
+    rawElection.loc[rawElection.iloc[:, 0] == 'Riding 3', majorityLabel] = None
+    expected = reference_generateElectionDataforRidings(rawElection, 42).sort_values('riding').reset_index(drop=True)
+    actual = generateElectionDataforRidings(rawElection, 42)
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+    assert actual.set_index('riding').loc['Riding 3', 'MP'] == 0
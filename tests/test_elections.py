@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from elections import find_elections, load_elections, parliament_of
+from join_data import LABEL_MAP, generateElectionDataforRidings
+from benchmarks.synthetic import make_election
+
+
+@pytest.fixture
+def election_dir(tmp_path):
+    directory = tmp_path / 'electionResults'
+    directory.mkdir()
+    for parliament, labels in LABEL_MAP.items():
+        make_election(30, labels, seed=parliament).to_csv(directory / f'{parliament}Election.csv', index=False,
+                                                         encoding='latin-1' if parliament < 40 else 'utf-8')
+    return directory
+
+
+def _expected(directory):
+    rawElections = {p: pd.read_csv(directory / f'{p}Election.csv', encoding='latin-1' if p < 40 else 'utf-8') for p in LABEL_MAP}
+    return pd.concat([generateElectionDataforRidings(raw, p) for p, raw in rawElections.items()], ignore_index=True)
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_matches_per_file_loading(election_dir, tmp_path, cached):
+    cache_dir = str(tmp_path / 'cache') if cached else None
+    load_elections(str(election_dir), cache_dir=cache_dir)
+    actual = load_elections(str(election_dir), cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(actual.drop(columns='jurisdiction'), _expected(election_dir), check_dtype=False)
+
+
+def test_parliament_from_name_or_manifest(election_dir):
+    assert parliament_of('38Election.csv') == 38
+    assert parliament_of('table_tableau12_38.csv') is None
+
+    (election_dir / '42Election.csv').rename(election_dir / 'table_tableau12_42.csv')
+    with pytest.raises(ValueError):
+        find_elections(str(election_dir))
+
+    (election_dir / 'elections.csv').write_text('file,parliament\ntable_tableau12_42.csv,42\n')
+    assert sorted(f.parliament for f in find_elections(str(election_dir))) == [38, 39, 40, 41, 42]
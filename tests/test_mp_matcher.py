@@ -0,0 +1,31 @@
+import pandas as pd
+
+from mp_matcher import MPMatcher
+from benchmarks.mp_matching import NEW_COLUMNS, reference_match, run
+
+
+def test_matches_original_loop():
+    n, loopTime, matcherTime, differ, report = run(n_ridings=40, n_unmatched=10)
+    assert len(differ) == 0
+
+
+def test_names_compare_as_case_sensitive_substrings():
+    # accented, mixed-case, and substring surnames are matched exactly as the original loop matched them
+    results = pd.DataFrame({'MP': ['Ménard, Réal Bloc Québécois', 'MacKay, Peter Conservative', 'Mayes, Colin Conservative',
+                                   'May, Elizabeth Green Party', 'de Burgh Graham, David Liberal', 'Lee, Cathy NDP',
+                                   'Lee, Bob Liberal', 'mckay, john Liberal'],
+                            'ParliamentNo': [38, 38, 38, 38, 42, 38, 38, 38]})
+    for column in NEW_COLUMNS:
+        results[column] = range(len(results))
+    results['riding'] = [f'Riding {j}' for j in range(len(results))]
+    speakers = pd.DataFrame({'speakername': ['Réal Ménard', 'Real Menard', 'Peter MacKay', 'Peter Mackay', 'Colin May',
+                                             'Elizabeth May', 'David de Burgh Graham', 'Bob Lee', 'John McKay',
+                                             'john mckay', 'Cathy Lee', 'Elizabeth Mayes'],
+                             'parliamentNo': ['38']*6 + ['42'] + ['38']*5})
+
+    expected = reference_match(speakers, results)
+    actual, report = MPMatcher(results).join(speakers, NEW_COLUMNS)
+    assert actual.riding.tolist() == expected.riding.tolist()
+    assert actual.riding.tolist() == ['Riding 0', 0, 'Riding 1', 0, 'Riding 2', 'Riding 3', 'Riding 4', 'Riding 6', 0,
+                                      'Riding 7', 'Riding 5', 0]
+    assert sorted(report.speakername) == ['Elizabeth Mayes', 'John McKay', 'Peter Mackay', 'Real Menard']
@@ -0,0 +1,102 @@
+import string
+import unicodedata
+from functools import reduce
+
+import pytest
+from nltk.stem.snowball import SnowballStemmer
+from nltk.tokenize import ToktokTokenizer
+from sklearn.feature_extraction import text as xtext
+
+import preprocessing
+from preprocessing import TOKENIZERS, TextCleaner, clean_texts
+from benchmarks.synthetic import make_speeches, write_parliaments
+
+
+# original implementation of preprocessing.clean_text, kept verbatim to check TextCleaner against
+def reference_strip_accents(text):
+    text = unicodedata.normalize('NFD', text)
+    text = text.encode('ascii', 'ignore')
+    text = text.decode("utf-8")
+    return str(text)
+
+def reference_clean_text(text):
+    tk = ToktokTokenizer()
+    stopwords = ['member','members','government','governments','opposition','opposite','leader',
+        'hon','exminister','prime','minister','ministers','parliament','house',
+        'ask','asked','asks','question','questioned','questions','bills','bill',
+        'party','parties','mp','mps','sir','madam','mr','gentleman','gentlemen','lady','ladies',
+        'speaker','chair','motion','motions','vote','votes','order','yes','deputy','secretary',
+        'canada','canadian','canadians',
+        'pursuant','supply','supplementary','please','friend','s',
+        'clause','amendment','i','ii','iii','section','sections', 'colleague', 'colleagues'] + list(xtext.ENGLISH_STOP_WORDS)
+
+    # For replacement of contractions.
+    contractions = {"you'd": 'you would', "he'd": 'he would', "she's": 'she is', "where'd": 'where did', "might've": 'might have', "he'll": 'he will', "they'll": 'they will',  "mightn't": 'might not', "you'd've": 'you would have', "shan't": 'shall not', "it'll": 'it will', "mayn't": 'may not', "couldn't": 'could not', "they'd": 'they would', "so've": 'so have', "needn't've": 'need not have', "they'll've": 'they will have', "it's": 'it is', "haven't": 'have not', "didn't": 'did not', "y'all'd": 'you all would', "needn't": 'need not', "who'll": 'who will', "wouldn't've": 'would not have', "when's": 'when is', "will've": 'will have', "it'd've": 'it would have', "what'll": 'what will', "that'd've": 'that would have', "y'all're": 'you all are', "let's": 'let us', "where've": 'where have', "o'clock": 'oclock', "when've": 'when have', "what're": 'what are', "should've": 'should have', "you've": 'you have', "they're": 'they are', "aren't": 'are not', "they've": 'they have', "it'd": 'it would', "i'll've": 'i will have', "they'd've": 'they would have', "you'll've": 'you will have', "wouldn't": 'would not', "we'd": 'we would', "hadn't've": 'had not have', "weren't": 'were not', "i'd": 'i would', "must've": 'must have', "what's": 'what is', "mustn't've": 'must not have', "what'll've": 'what will have', "ain't": 'aint', "doesn't": 'does not', "we'll": 'we will', "i'd've": 'i would have', "we've": 'we have', "oughtn't": 'ought not', "you're": 'you are', "who'll've": 'who will have', "shouldn't": 'should not', "can't've": 'cannot have', "i've": 'i have', "couldn't've": 'could not have', "why've": 'why have', "what've": 'what have', "can't": 'cannot', "don't": 'do not', "that'd": 'that would', "who's": 'who is', "would've": 'would have', "there'd": 'there would', "shouldn't've": 'should not have', "y'all": 'you all', "mustn't": 'must not', "she'll": 'she will', "hadn't": 'had not', "won't've": 'will not have', "why's": 'why is', "'cause": 'because', "wasn't": 'was not', "shan't've": 'shall not have', "ma'am": 'madam', "hasn't": 'has not', "to've": 'to have', "how'll": 'how will', "oughtn't've": 'ought not have', "he'll've": 'he will have', "we'd've": 'we would have', "won't": 'will not', "could've": 'could have', "isn't": 'is not', "she'll've": 'she will have', "we'll've": 'we will have', "you'll": 'you will', "who've": 'who have', "there's": 'there is', "y'all've": 'you all have', "we're": 'we are', "i'll": 'i will', "i'm": 'i am', "how's": 'how is', "she'd've": 'she would have', "sha'n't": 'shall not', "there'd've": 'there would have', "he's": 'he is', "it'll've": 'it will have', "that's": 'that is', "y'all'd've": 'you all would have', "he'd've": 'he would have', "how'd": 'how did', "where's": 'where is', "so's": 'so as', "she'd": 'she would', "mightn't've": 'might not have'}
+
+    # replace contractions
+    text = reduce(lambda a, kv: a.replace(*kv), contractions.items(), text.lower())
+    
+    # replace tab, newline, and carriage return characters with spaces
+    text = text.replace('\t',' ').replace('\n',' ').replace('\r',' ')
+    
+    # replace punctuation with spaces
+    text = text.translate(str.maketrans(string.punctuation, ' '*len(string.punctuation)))
+    
+    # remove accent characters
+    text = reference_strip_accents(text)
+    
+    # tokenize for stopword removal
+    tokens = tk.tokenize(text)
+    
+    # remove stopwords
+    tokens = [w for w in tokens if w not in stopwords and len(w)>2 and w!=' ' and not w.isdigit()]
+    
+    # stemming using Snowball
+    tokens = [SnowballStemmer('english').stem(w) for w in tokens]
+    
+    # return string of tokens in order 
+    return ' '.join(tokens)
+
+
+EDGE_CASES = [
+    # decompose to ; and ` once accents are stripped, after punctuation was already replaced
+    'greek question mark\u037e here and varia\u1fef there',
+    '\u037e\u1fef\u037e',
+    # adjacent and overlapping contractions
+    "don'tcan't won'twon't y'all'd've y'all'dve can't've'cause",
+    "IT'S I'D'VE shan't've sha'n't ma'am o'clock 'cause'cause",
+    "she'd've'd he's's it'll've'll",
+    "tab\tnew\nline\rreturn 12 345 ab abc élection QUÉBÉCOIS Montréal",
+    '',
+    '   ',
+]
+
+
+def _all_code_points(size=2000):
+    text = ''.join(chr(c) for c in range(0x110000) if not 0xd800 <= c <= 0xdfff)
+    return [text[i:i+size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize('tokenizer', TOKENIZERS)
+def test_matches_original_clean_text(tokenizer):
+    texts = make_speeches(300, seed=3) + EDGE_CASES
+    cleaner = TextCleaner(tokenizer=tokenizer)
+    assert [cleaner.clean(t) for t in texts] == [reference_clean_text(t) for t in texts]
+
+
+@pytest.mark.parametrize('tokenizer', TOKENIZERS)
+def test_matches_original_on_every_code_point(tokenizer):
+    texts = _all_code_points()
+    assert clean_texts(texts, cleaner=TextCleaner(tokenizer=tokenizer)) == [reference_clean_text(t) for t in texts]
+
+
+def test_streaming_matches_in_memory(tmp_path):
+    root = str(tmp_path / 'speeches')
+    write_parliaments(root, 1500, seed=4)
+    inMemory, streamed = str(tmp_path / 'in_memory.csv'), str(tmp_path / 'streamed.csv')
+    preprocessing.main(workers=1, stream=False, root=root, output=inMemory)
+    preprocessing.main(workers=2, stream=True, chunksize=200, root=root, output=streamed)
+    with open(inMemory, 'rb') as f, open(streamed, 'rb') as g:
+        expected = f.read()
+        assert expected.count(b'\n') > 1000
+        assert g.read() == expected
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from speech_stats import make_speech_statistics, partial_statistics
+from benchmarks.speech_stats import reference_speech_statistics
+from benchmarks.synthetic import make_corpus
+
+
+def test_matches_original_loop(tmp_path):
+    corpus = tmp_path / 'corpus.tsv'
+    frame = make_corpus(3000, n_mps=50, seed=2)
+    # the original counts an empty speech as missing, so every speech keeps at least one word
+    frame[2] = frame[2].where(frame[2] != '', 'word')
+    frame.to_csv(corpus, sep='\t', index=False, header=False)
+
+    stats = make_speech_statistics(str(corpus), chunksize=700, output=str(tmp_path / 'stats.csv'),
+                                   detailed_output=None, parliament_output=None)
+    expected = reference_speech_statistics(str(corpus))
+    assert stats.speechFrequency.sum() == len(frame)
+    assert list(stats.index) == list(expected.index)
+    np.testing.assert_array_equal(stats[['speechFrequency', 'totalSpeechLength']].values, expected.values)
+
+
+def test_missing_speaker_raises():
+    chunk = pd.DataFrame({'Parliament': [38, 39], 'speechtext': ['a b', 'c'], 'speakername': ['Jack Layton', None],
+                          'speakerparty': ['NDP', 'Liberal']})
+    with pytest.raises(ValueError):
+        partial_statistics(chunk)